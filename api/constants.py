@@ -4,3 +4,7 @@ PLAYER_REGISTERED_TOPIC_0 = (
 PLAYER_HIGH_SCORE_TOPIC_0 = (
     "0xec51f1f19b3cb8ab4176d8a463cb3b7a4bb866380c5ee1c51da9577ad94db00a"
 )
+# ScoreConsumed(address indexed player, uint256 indexed score, bytes32 indexed nonce)
+SCORE_CONSUMED_TOPIC_0 = (
+    "0xca2821321bf5e7437c68e90f7f9b9c911777131e4316f3e4a23dc6f17e9f6a27"
+)
@@ -1,4 +1,20 @@
-from rest_framework.pagination import LimitOffsetPagination
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from hashlib import sha256
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    BasePagination,
+    LimitOffsetPagination,
+    _positive_int,
+)
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
 
 class ApiPagination(LimitOffsetPagination):
@@ -13,3 +29,258 @@ class ApiPagination(LimitOffsetPagination):
     max_limit = 1000
     limit_query_param = "limit"
     offset_query_param = "offset"
+
+
+class CountlessPagination(ApiPagination):
+    """
+    A limit/offset based style that skips the exact `COUNT(*)`. One extra row is fetched
+    to know whether there is a next page, and `count` is an estimate: the planner's row
+    estimate on postgres, otherwise an exact count cached for `count_cache_timeout`.
+
+    http://api.example.org/accounts/?limit=100
+    http://api.example.org/accounts/?offset=400&limit=100
+    """
+
+    count_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.limit = self.get_limit(request)
+        if self.limit is None:
+            return None
+
+        self.offset = self.get_offset(request)
+        self.count = self.get_estimated_count(queryset)
+
+        # fetch one extra row to know whether there is more to come
+        results = list(queryset[self.offset : self.offset + self.limit + 1])
+        self.has_next = len(results) > self.limit
+        return results[: self.limit]
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "has_next": self.has_next,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema["properties"]["has_next"] = {"type": "boolean"}
+        response_schema["required"].append("has_next")
+        return response_schema
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(
+            url, self.offset_query_param, self.offset + self.limit
+        )
+
+    def get_estimated_count(self, queryset) -> int:
+        sql, params = queryset.order_by().query.sql_with_params()
+        key = "pagination:count:" + sha256(repr((sql, params)).encode()).hexdigest()
+        if (count := cache.get(key)) is not None:
+            return count
+
+        if connection.vendor == "postgresql":
+            plan = json.loads(queryset.order_by().explain(format="json"))
+            count = int(plan[0]["Plan"]["Plan Rows"])
+        else:
+            count = queryset.count()
+
+        cache.set(key, count, self.count_cache_timeout)
+        return count
+
+
+class KeysetPagination(BasePagination):
+    """
+    A keyset (seek) based style. Pages are fetched by filtering on the ordering
+    key of the last row seen instead of skipping rows, so every page costs the same
+    no matter how deep it is. The ordering must be unique, so always end it with `id`.
+
+    http://api.example.org/accounts/?cursor=
+    http://api.example.org/accounts/?cursor=eyJwIjpbMTAwLDJdLCJyIjowfQ&limit=100
+    """
+
+    default_limit = ApiPagination.default_limit
+    max_limit = ApiPagination.max_limit
+    limit_query_param = "limit"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    # fields to seek on, e.g. ("-score", "id")
+    ordering: tuple[str, ...] = ("id",)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.limit = self.get_limit(request)
+        position, reverse = self.decode_cursor(request, queryset.model)
+
+        # order the queryset, flipping the direction when paging backwards
+        ordering = self.ordering
+        if reverse:
+            ordering = tuple(self._flip(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+
+        # seek past the cursor position
+        if position is not None:
+            queryset = queryset.filter(self._seek(ordering, position))
+
+        # fetch one extra row to know whether there is more to come
+        results = list(queryset[: self.limit + 1])
+        has_more = len(results) > self.limit
+        self.page = results[: self.limit]
+        if reverse:
+            self.page.reverse()
+
+        # work out which directions can still be paged
+        if reverse:
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                    "example": "http://api.example.org/accounts/?cursor=eyJwIjpbMTAwLDJdLCJyIjowfQ",
+                },
+                "previous": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                    "example": "http://api.example.org/accounts/?cursor=eyJwIjpbMTAwLDJdLCJyIjoxfQ",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.limit_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def get_limit(self, request) -> int:
+        try:
+            return _positive_int(
+                request.query_params[self.limit_query_param],
+                strict=True,
+                cutoff=self.max_limit,
+            )
+        except (KeyError, ValueError):
+            return self.default_limit
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self._position(self.page[0]), reverse=True)
+
+    def encode_cursor(self, position: list, reverse: bool) -> str:
+        data = json.dumps({"p": position, "r": int(reverse)}, default=_json_default)
+        token = urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+        url = remove_query_param(self.base_url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request, model) -> tuple[list | None, bool]:
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None, False
+
+        try:
+            padded = token + "=" * (-len(token) % 4)
+            data = json.loads(urlsafe_b64decode(padded.encode("ascii")))
+            values = data["p"]
+            reverse = bool(data.get("r", 0))
+            if not isinstance(values, list) or len(values) != len(self.ordering):
+                raise ValueError("Cursor position doesn't match the ordering")
+
+            # coerce each value to its ordering field so bad ones never reach the db
+            position = []
+            for field, value in zip(self.ordering, values):
+                value = model._meta.get_field(field.lstrip("-")).to_python(value)
+                if value is None:
+                    raise ValueError("Cursor position can't be null")
+                position.append(value)
+        except (KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return position, reverse
+
+    def _position(self, instance) -> list:
+        return [_get_value(instance, field.lstrip("-")) for field in self.ordering]
+
+    @staticmethod
+    def _flip(field: str) -> str:
+        return field[1:] if field.startswith("-") else f"-{field}"
+
+    @staticmethod
+    def _seek(ordering: tuple[str, ...], position: list) -> Q:
+        """
+        Builds the row comparison `(a, b, c) > (x, y, z)` for a mixed direction ordering:
+        `a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)`
+        """
+        query = Q()
+        for i, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            clause = Q(**{f"{name}__{lookup}": position[i]})
+            for prev_field, prev_value in zip(ordering[:i], position[:i]):
+                clause &= Q(**{prev_field.lstrip("-"): prev_value})
+            query |= clause
+        return query
+
+
+def _get_value(instance, field: str):
+    if isinstance(instance, dict):
+        return instance[field]
+    return getattr(instance, field)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot encode {type(value).__name__} in a cursor")
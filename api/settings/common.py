@@ -31,10 +31,44 @@ ALLOWED_HOSTS = env.list("ALLOWED_HOSTS")
 NONCE_LENGTH = 16
 NONCE_EXPIRATION = timedelta(minutes=15)
 APP_CHAIN_ID = 11011
+SCORE_SIGNING_CHUNK_SIZE = 10
+SCORE_SIGNING_WORKERS = 4
+SCORE_SIGNING_EAGER = False
+SCORE_BATCH_MAX_SIZE = 5000
+SCORE_BATCH_CHUNK_SIZE = 1000
+# accounts allowed to report scores in bulk
+GAME_SERVER_GROUP = "game-servers"
+CONSUMED_NONCE_FILTER_BITS = 2**20
+CONSUMED_NONCE_FILTER_HASHES = 7
+CONSUMED_NONCE_FILTER_TTL = timedelta(minutes=5)
+CONSUMED_NONCE_RETENTION = timedelta(days=30)
+CONSUMED_NONCE_PRUNE_CHUNK_SIZE = 5000
 TICKET_NAME = "Reward Ticket"
 TICKET_DESCRIPTION = "A little reward for your participation and performance in the 0xArcade. Stuff your pockets with enough of these and you might just unlock some epic rewards. 👀"
 TICKET_IMAGE_URL = "https://arweave.net/EAaB6gq782CAk4IO_Jm9jKcDI1qB6b9cGm90aI_Ij7g"
 
+# Leaderboards
+LEADERBOARD_CACHE_TTL = timedelta(seconds=30)
+LEADERBOARD_SYNC_INTERVAL = timedelta(seconds=1)
+LEADERBOARD_SYNC_LOOKBACK = timedelta(seconds=10)
+LEADERBOARD_CHANGE_RETENTION = timedelta(hours=1)
+LEADERBOARD_CHANGE_PRUNE_CHUNK_SIZE = 5000
+LEADERBOARD_EXPORT_CHUNK_SIZE = 2000
+LEADERBOARD_EVENTS_KEEPALIVE = timedelta(seconds=15)
+LEADERBOARD_EVENTS_QUEUE_SIZE = 100
+LEADERBOARD_PRERENDER_SIZE = 24
+SNAPSHOT_CACHE_MAX_ROWS = 1_000_000
+
+# Webhooks
+WEBHOOKS_EAGER = False
+WEBHOOK_REGISTRY_TTL = timedelta(minutes=1)
+WEBHOOK_PROCESS_BATCH_SIZE = 50
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_RETRY_BACKOFF = timedelta(seconds=30)
+WEBHOOK_POLL_INTERVAL = timedelta(seconds=1)
+WEBHOOK_EVENT_RETENTION = timedelta(days=7)
+WEBHOOK_EVENT_PRUNE_CHUNK_SIZE = 5000
+
 # Know Your Memes
 KYM_GAME_ADDRESS = "0x6bD4A37Fc5753425fA566103a51Fd7355d940D48"
 KYM_GAME_DURATION = timedelta(seconds=30)
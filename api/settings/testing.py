@@ -14,6 +14,12 @@ DATABASES = {
     },
 }
 
+# sign scores inline so tests don't race background writes
+SCORE_SIGNING_EAGER = True
+
+# process webhook events on commit instead of leaving them to the worker
+WEBHOOKS_EAGER = True
+
 # HUEY["huey_class"] = "huey.MemoryHuey"  # noqa: F405
 # HUEY["immediate"] = True  # noqa: F405
 # del HUEY["connection"]  # noqa: F405
@@ -24,11 +24,19 @@ from drf_spectacular.views import (
 from knox.views import LogoutAllView, LogoutView
 
 from games.views import (
+    BatchScoresView,
     DeleteScoresView,
     GameViewSet,
+    GlobalLeaderboardViewSet,
+    LeaderboardEventsView,
+    LeaderboardExportView,
+    LeaderboardRankView,
+    LeaderboardSnapshotEntryViewSet,
+    LeaderboardSnapshotViewSet,
     LeaderboardViewSet,
     PlayerHighScoreViewSet,
     PlayerScoreViewSet,
+    ScoreDistributionView,
     SignScoresView,
     TicketMetadataView,
 )
@@ -40,7 +48,7 @@ from users.views import (
     OTPLoginView,
     UserInfoView,
 )
-from webhooks.views import IndexPlayerHighScoreView
+from webhooks.views import IndexPlayerHighScoreView, IndexScoreConsumedView
 
 from . import views as api_views
 
@@ -77,6 +85,7 @@ urlpatterns = [
     # Webhooks
     #
     path("games/index/player-high-score", IndexPlayerHighScoreView.as_view()),
+    path("games/index/score-consumed", IndexScoreConsumedView.as_view()),
     #
     # Ticket Metadata
     #
@@ -84,7 +93,36 @@ urlpatterns = [
     #
     # Leaderboard
     #
+    path("leaderboard/global", GlobalLeaderboardViewSet.as_view({"get": "list"})),
     path("leaderboard/<int:game_id>", LeaderboardViewSet.as_view({"get": "list"})),
+    path("leaderboard/<int:game_id>/me", LeaderboardRankView.as_view()),
+    path(
+        "leaderboard/<int:game_id>/distribution",
+        ScoreDistributionView.as_view(),
+    ),
+    path("leaderboard/<int:game_id>/events", LeaderboardEventsView.as_view()),
+    path(
+        "leaderboard/<int:game_id>/snapshots",
+        LeaderboardSnapshotViewSet.as_view({"get": "list"}),
+    ),
+    path(
+        "leaderboard/snapshots/<int:snapshot_id>",
+        LeaderboardSnapshotEntryViewSet.as_view({"get": "list"}),
+    ),
+    path(
+        "leaderboard/snapshots/<int:snapshot_id>/rank",
+        LeaderboardSnapshotEntryViewSet.as_view({"get": "rank"}),
+    ),
+    path(
+        "leaderboard/<int:game_id>/export.csv",
+        LeaderboardExportView.as_view(),
+        {"export_format": "csv"},
+    ),
+    path(
+        "leaderboard/<int:game_id>/export.ndjson",
+        LeaderboardExportView.as_view(),
+        {"export_format": "ndjson"},
+    ),
     #
     # Player High Scores
     #
@@ -97,6 +135,7 @@ urlpatterns = [
     # Player Scores
     #
     path("scores", PlayerScoreViewSet.as_view({"get": "list"})),
+    path("scores/batch", BatchScoresView.as_view()),
     path("scores/sign", SignScoresView.as_view()),
     path("scores/delete", DeleteScoresView.as_view()),
     #
@@ -118,8 +157,4 @@ urlpatterns = [
         kym_views.QuestionViewSet.as_view({"post": "submit_answer"}),
     ),
     path("kym/metadata/<int:token_id>", kym_views.KYMTrophyMetadataView.as_view()),
-    path(
-        "kym/demo/submit",
-        kym_views.GameplayViewset.as_view({"post": "demo_score_submission"}),
-    ),
 ]
@@ -1,11 +1,20 @@
 from django.contrib import admin
 
-from .models import Game, PlayerHighScore, PlayerScore
+from .models import (
+    ConsumedNonce,
+    Game,
+    LeaderboardSnapshot,
+    PlayerHighScore,
+    PlayerScore,
+    PlayerSummary,
+)
+from .snapshots import take_snapshot
 
 
 class GameAdmin(admin.ModelAdmin):
     list_display = ("name", "url")
     search_fields = ("name",)
+    actions = ["snapshot_leaderboard"]
     readonly_fields = ("created_at", "updated_at")
     fieldsets = (
         (None, {"fields": ("name", "description", "url")}),
@@ -16,15 +25,21 @@ class GameAdmin(admin.ModelAdmin):
         ),
     )
 
+    @admin.action(description="Snapshot leaderboard")
+    def snapshot_leaderboard(self, request, queryset):
+        for game in queryset:
+            take_snapshot(game.id)
+        self.message_user(request, f"Snapshotted {len(queryset)} leaderboard(s).")
+
 
 class PlayerHighScoreAdmin(admin.ModelAdmin):
-    list_display = ("id", "user__username", "game__name", "score", "token_id")
+    list_display = ("id", "user__username", "game__name", "score", "rank", "token_id")
     list_filter = ("game__name",)
     sortable_by = ("score",)
     search_fields = ("user__username", "game__name", "token_id")
     readonly_fields = ("created_at", "updated_at")
     fieldsets = (
-        (None, {"fields": ("user", "game", "score", "token_id")}),
+        (None, {"fields": ("user", "game", "score", "rank", "token_id")}),
         (
             "Metadata",
             {"fields": readonly_fields},
@@ -37,7 +52,7 @@ class PlayerScoreAdmin(admin.ModelAdmin):
     list_filter = ("game__name",)
     sortable_by = ("score",)
     search_fields = ("user__username", "game__name")
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = ("nonce", "signature", "created_at", "updated_at")
     fieldsets = (
         (
             None,
@@ -56,6 +71,37 @@ class PlayerScoreAdmin(admin.ModelAdmin):
     )
 
 
+class PlayerSummaryAdmin(admin.ModelAdmin):
+    list_display = ("id", "user__username", "total_score", "games_played", "best_rank")
+    sortable_by = ("total_score",)
+    search_fields = ("user__username",)
+    readonly_fields = (
+        "user",
+        "total_score",
+        "games_played",
+        "best_rank",
+        "created_at",
+        "updated_at",
+    )
+
+
+class LeaderboardSnapshotAdmin(admin.ModelAdmin):
+    list_display = ("id", "game__name", "block_number", "size", "created_at")
+    list_filter = ("game__name",)
+    readonly_fields = ("game", "block_number", "size", "created_at")
+    exclude = ("user_ids", "scores", "token_ids")
+
+
+class ConsumedNonceAdmin(admin.ModelAdmin):
+    list_display = ("id", "game__name", "nonce", "created_at")
+    list_filter = ("game__name",)
+    search_fields = ("nonce",)
+    readonly_fields = ("game", "nonce", "created_at")
+
+
 admin.site.register(Game, GameAdmin)
 admin.site.register(PlayerHighScore, PlayerHighScoreAdmin)
 admin.site.register(PlayerScore, PlayerScoreAdmin)
+admin.site.register(PlayerSummary, PlayerSummaryAdmin)
+admin.site.register(LeaderboardSnapshot, LeaderboardSnapshotAdmin)
+admin.site.register(ConsumedNonce, ConsumedNonceAdmin)
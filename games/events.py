@@ -0,0 +1,139 @@
+"""
+Live leaderboard events. High score changes are published once committed and fanned out
+in-process to every open stream on the game, so displays can follow a leaderboard
+without polling it. Open streams also sync the leaderboards while they wait, so changes
+indexed by other processes reach them too, see `games.leaderboard`.
+
+Streams are served as server-sent events. Under ASGI each subscriber waits on an
+`asyncio.Queue` on the event loop, under the gevent WSGI workers it waits on a plain
+`queue.Queue`, which gevent makes cooperative. Inboxes are bounded by
+`LEADERBOARD_EVENTS_QUEUE_SIZE`, a stream that falls that far behind is closed so the
+client reconnects and reloads the board instead of holding events in memory.
+"""
+
+import asyncio
+import json
+import queue
+import threading
+from dataclasses import asdict, dataclass
+from time import monotonic
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+_lock = threading.Lock()
+_subscribers: dict[int, set["Subscription"]] = {}
+
+
+@dataclass(slots=True)
+class LeaderboardEvent:
+    id: int
+    user_id: int
+    token_id: int
+    score: int
+    rank: int
+    previous_score: int | None
+    previous_rank: int | None
+
+    def encode(self) -> str:
+        return f"event: score\ndata: {json.dumps(asdict(self))}\n\n"
+
+
+class Subscription:
+    """A single stream's inbox, pass the event loop when the stream is async"""
+
+    def __init__(self, game_id: int, loop: asyncio.AbstractEventLoop | None = None):
+        self.game_id = game_id
+        self.loop = loop
+        size = settings.LEADERBOARD_EVENTS_QUEUE_SIZE
+        self.queue = asyncio.Queue(size) if loop else queue.Queue(size)
+        # set once an event is dropped, the stream ends instead of skipping changes
+        self.overflowed = False
+
+    def put(self, event: LeaderboardEvent):
+        if self.loop:
+            self.loop.call_soon_threadsafe(self._put, event)
+        else:
+            self._put(event)
+
+    def _put(self, event: LeaderboardEvent):
+        try:
+            self.queue.put_nowait(event)
+        except (queue.Full, asyncio.QueueFull):
+            self.overflowed = True
+
+    def __enter__(self) -> "Subscription":
+        with _lock:
+            _subscribers.setdefault(self.game_id, set()).add(self)
+        return self
+
+    def __exit__(self, *args):
+        with _lock:
+            subscribers = _subscribers.get(self.game_id, set())
+            subscribers.discard(self)
+            if not subscribers:
+                _subscribers.pop(self.game_id, None)
+
+
+def has_subscribers(game_id: int) -> bool:
+    return bool(_subscribers.get(game_id))
+
+
+def publish(game_id: int, event: LeaderboardEvent):
+    with _lock:
+        subscribers = list(_subscribers.get(game_id, ()))
+    for subscription in subscribers:
+        subscription.put(event)
+
+
+def _sync_leaderboards():
+    """Picks up changes from other processes without holding a connection between syncs"""
+    from games.leaderboard import sync_leaderboards
+
+    if sync_leaderboards():
+        connection.close()
+
+
+def _timeouts() -> tuple[float, float]:
+    keepalive = settings.LEADERBOARD_EVENTS_KEEPALIVE.total_seconds()
+    interval = settings.LEADERBOARD_SYNC_INTERVAL.total_seconds()
+    return keepalive, min(keepalive, interval)
+
+
+def stream(game_id: int):
+    """Server-sent event lines for a game, with keepalive comments while idle"""
+    keepalive, timeout = _timeouts()
+    with Subscription(game_id) as subscription:
+        yield "retry: 3000\n\n"
+        idle_since = monotonic()
+        while not subscription.overflowed:
+            try:
+                event = subscription.queue.get(timeout=timeout)
+            except queue.Empty:
+                _sync_leaderboards()
+                if monotonic() - idle_since >= keepalive:
+                    idle_since = monotonic()
+                    yield ": keepalive\n\n"
+            else:
+                idle_since = monotonic()
+                yield event.encode()
+
+
+async def astream(game_id: int):
+    """Async version of `stream`, subscribes on the running event loop"""
+    keepalive, timeout = _timeouts()
+    with Subscription(game_id, loop=asyncio.get_running_loop()) as subscription:
+        yield "retry: 3000\n\n"
+        idle_since = monotonic()
+        while not subscription.overflowed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), timeout)
+            except TimeoutError:
+                await sync_to_async(_sync_leaderboards)()
+                if monotonic() - idle_since >= keepalive:
+                    idle_since = monotonic()
+                    yield ": keepalive\n\n"
+            else:
+                idle_since = monotonic()
+                yield event.encode()
@@ -1,8 +1,68 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import sha256
+from itertools import batched
+
+import gevent.monkey
 from django.conf import settings
-from eth_account import Account
-from eth_account.datastructures import SignedMessage
+from django.db import connection, transaction
+from eth_keys import keys
+from eth_utils import keccak, to_canonical_address
+from hexbytes import HexBytes
 from web3 import Web3
 
+from games.models import PlayerScore
+
+EIP712_DOMAIN_TYPE_HASH = keccak(
+    text="EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)"
+)
+VERIFIED_SCORE_TYPE_HASH = keccak(
+    text="VerifiedScore(address player,uint256 score,bytes32 nonce)"
+)
+
+
+class ScoreSigner:
+    """
+    EIP-712 signer for a game's `VerifiedScore` messages. The domain separator and the
+    parsed signing key are worked out once, so signing only hashes the score struct.
+    """
+
+    def __init__(self, name: str, game_address: str, signing_key: str, chain_id: int):
+        self.domain_separator = keccak(
+            EIP712_DOMAIN_TYPE_HASH
+            + keccak(text=name)
+            + keccak(text="1")
+            + chain_id.to_bytes(32, "big")
+            + bytes(12)
+            + to_canonical_address(Web3.to_checksum_address(game_address))
+        )
+        self.private_key = keys.PrivateKey(HexBytes(signing_key))
+
+    def sign(self, player: str, score: int, nonce: str) -> str:
+        struct_hash = keccak(
+            VERIFIED_SCORE_TYPE_HASH
+            + bytes(12)
+            + to_canonical_address(player)
+            + score.to_bytes(32, "big")
+            + HexBytes(nonce).ljust(32, b"\0")
+        )
+        signature = self.private_key.sign_msg_hash(
+            keccak(b"\x19\x01" + self.domain_separator + struct_hash)
+        )
+
+        # r || s || v with v shifted to 27/28, the same bytes eth_account returns
+        r, s, v = signature.r, signature.s, signature.v + 27
+        return f"0x{(r.to_bytes(32, 'big') + s.to_bytes(32, 'big') + bytes([v])).hex()}"
+
+
+@lru_cache(maxsize=256)
+def get_score_signer(
+    name: str, game_address: str, signing_key: str, chain_id: int
+) -> ScoreSigner:
+    """Signers are cached by everything that goes into them, so edited games get a new one"""
+    return ScoreSigner(name, game_address, signing_key, chain_id)
+
 
 def sign_score(
     name: str, game_address: str, signing_key: str, player: str, score: int, nonce: str
@@ -10,23 +70,121 @@ def sign_score(
     """
     Takes in data to sign and returns the EIP-712 signatures
     """
-    domain_data = {
-        "name": name,
-        "version": "1",
-        "chainId": int(settings.APP_CHAIN_ID),
-        "verifyingContract": Web3.to_checksum_address(game_address),
-    }
-    message_types = {
-        "VerifiedScore": [
-            {"name": "player", "type": "address"},
-            {"name": "score", "type": "uint256"},
-            {"name": "nonce", "type": "bytes32"},
-        ]
-    }
-    message_data = {"player": player, "score": score, "nonce": nonce}
+    signer = get_score_signer(
+        name, game_address, signing_key, int(settings.APP_CHAIN_ID)
+    )
+    return signer.sign(player, score, nonce)
+
+
+_executor_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SCORE_SIGNING_WORKERS,
+                thread_name_prefix="score-signing",
+            )
+    return _executor
+
+
+def _sign_chunk(chunk: tuple[tuple[ScoreSigner, str, int, str], ...]) -> list[str]:
+    return [signer.sign(player, score, nonce) for signer, player, score, nonce in chunk]
+
 
-    signed_typed_data: SignedMessage = Account.sign_typed_data(
-        signing_key, domain_data, message_types, message_data
+def sign_scores(scores: list[tuple[str, str, str, str, int, str]]) -> list[str]:
+    """
+    Signs a batch of `sign_score` argument tuples off the calling thread, split into
+    chunks across a thread pool, and returns the signatures in the same order.
+
+    Under gevent workers the chunks run on the hub's native threadpool and the caller
+    waits cooperatively, so other greenlets keep being served while a batch is signed.
+    """
+    chain_id = int(settings.APP_CHAIN_ID)
+
+    # resolve one signer per game up front, shared by every chunk with its scores
+    signers: dict[tuple[str, str, str], ScoreSigner] = {}
+    items = []
+    for name, game_address, signing_key, *score_data in scores:
+        game = (name, game_address, signing_key)
+        if game not in signers:
+            signers[game] = get_score_signer(*game, chain_id)
+        items.append((signers[game], *score_data))
+    chunks = list(batched(items, settings.SCORE_SIGNING_CHUNK_SIZE))
+
+    if gevent.monkey.is_module_patched("threading"):
+        threadpool = gevent.get_hub().threadpool
+        results = [threadpool.spawn(_sign_chunk, chunk) for chunk in chunks]
+        signatures = [result.get() for result in results]
+    else:
+        executor = _get_executor()
+        futures = [executor.submit(_sign_chunk, chunk) for chunk in chunks]
+        signatures = [future.result() for future in futures]
+
+    return [signature for chunk in signatures for signature in chunk]
+
+
+def score_nonce(score_id: int) -> str:
+    return f"0x{sha256(HexBytes(score_id)).hexdigest()}"
+
+
+def sign_player_scores(scores: list[PlayerScore]):
+    """
+    Fills in and stores the nonce and signature of scores that don't have one yet.
+    Scores need their `game` and `user` loaded.
+    """
+    unsigned = [score for score in scores if not score.signature]
+    if not unsigned:
+        return
+
+    for score in unsigned:
+        score.nonce = score_nonce(score.id)
+    signatures = sign_scores(
+        [
+            (
+                score.game.name,
+                score.game.eth_address,
+                score.game.signing_key,
+                score.user.eth_address,
+                score.score,
+                score.nonce,
+            )
+            for score in unsigned
+        ]
     )
+    for score, signature in zip(unsigned, signatures):
+        score.signature = signature
+
+    PlayerScore.objects.bulk_update(unsigned, ["nonce", "signature"])
+
+
+def sign_player_scores_on_commit(score_ids: list[int]):
+    """
+    Signs new scores once they are committed. Unless `SCORE_SIGNING_EAGER` is set this
+    happens in the background (a greenlet under gevent, a pool thread otherwise), so no
+    signing is left on the request path. Scores missed here are signed on first request.
+    """
+
+    def sign():
+        scores = PlayerScore.objects.filter(id__in=score_ids, signature="")
+        sign_player_scores(list(scores.select_related("game", "user")))
+
+    def sign_in_background():
+        try:
+            sign()
+        finally:
+            connection.close()
+
+    def defer():
+        if settings.SCORE_SIGNING_EAGER:
+            sign()
+        elif gevent.monkey.is_module_patched("threading"):
+            gevent.spawn(sign_in_background)
+        else:
+            _get_executor().submit(sign_in_background)
 
-    return f"0x{signed_typed_data.signature.hex()}"
+    transaction.on_commit(defer)
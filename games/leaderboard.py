@@ -0,0 +1,327 @@
+"""
+In-process leaderboards. Each game's high scores are loaded lazily into a list sorted
+on the leaderboard key `(score DESC, id)` and then updated in place whenever the high
+score webhook raises a score, so leaderboard reads don't need to sort in the db.
+
+Lookups (top-N, rank of a user, range by rank) are bisects and slices on the sorted
+keys, and the score distribution (histogram and percentiles) is computed in one pass
+over the sorted scores and kept until the board next changes. Each worker process
+keeps its own copy, so high score changes are also written to `LeaderboardChange`
+wherever they are indexed, and every process reads them back at most once per
+`LEADERBOARD_SYNC_INTERVAL` to update its boards and live streams. Boards are still
+reloaded after `LEADERBOARD_CACHE_TTL` in case a change was missed.
+"""
+
+import math
+import threading
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass
+from datetime import datetime
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.timezone import now
+
+from games.events import LeaderboardEvent, has_subscribers, publish
+from games.models import Game, LeaderboardChange, PlayerHighScore
+
+_lock = threading.Lock()
+_leaderboards: dict[int, "GameLeaderboard"] = {}
+
+# only one sync runs at a time, a sync that loads a board mustn't start another
+_sync_lock = threading.Lock()
+_synced_at: datetime | None = None
+_synced_at_monotonic = 0.0
+
+
+@dataclass(slots=True)
+class LeaderboardEntry:
+    id: int
+    user_id: int
+    token_id: int
+    score: int
+
+    @property
+    def key(self) -> tuple[int, int]:
+        return (-self.score, self.id)
+
+
+class ScoreDistribution:
+    """Score distribution of a leaderboard, built from its scores in ascending order"""
+
+    def __init__(self, scores: list[int]):
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def percentile(self, p: float) -> int | None:
+        """Nearest rank percentile, the lowest score at least `p`% of players reach"""
+        if not self.scores:
+            return None
+        index = max(math.ceil(p / 100 * len(self.scores)) - 1, 0)
+        return self.scores[index]
+
+    def percentile_of(self, score: int) -> float:
+        """Percentage of players with a lower score"""
+        if not self.scores:
+            return 0.0
+        return bisect_left(self.scores, score) / len(self.scores) * 100
+
+    def histogram(self, buckets: int) -> list[dict]:
+        """Counts in up to `buckets` equal width score ranges, bounds are inclusive"""
+        if not self.scores:
+            return []
+
+        low, high = self.scores[0], self.scores[-1]
+        width = math.ceil((high - low + 1) / buckets)
+        histogram = []
+        for start in range(low, high + 1, width):
+            end = start + width - 1
+            count = bisect_right(self.scores, end) - bisect_left(self.scores, start)
+            histogram.append({"min": start, "max": end, "count": count})
+        return histogram
+
+
+class GameLeaderboard:
+    """Order statistic view of a single game's high scores"""
+
+    def __init__(
+        self,
+        game_id: int,
+        entries: list[LeaderboardEntry],
+        last_modified: datetime | None = None,
+    ):
+        self.game_id = game_id
+        self.loaded_at = monotonic()
+        self.last_modified = last_modified
+        self._keys = sorted(entry.key for entry in entries)
+        self._entries = {entry.id: entry for entry in entries}
+        self._by_user = {entry.user_id: entry for entry in entries}
+        self._by_token = {entry.token_id: entry for entry in entries}
+        self._distribution: ScoreDistribution | None = None
+
+        # pre-rendered first page responses, dropped when a change reaches the top ranks
+        self.rendered: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    @property
+    def etag(self) -> str:
+        """
+        Version of the board's contents. Scores only ever go up and every change bumps
+        `updated_at`, so the entry count and the latest change pin down the state.
+        """
+        timestamp = self.last_modified.timestamp() if self.last_modified else 0
+        return f'W/"{self.game_id}-{len(self)}-{timestamp:.6f}"'
+
+    @property
+    def is_stale(self) -> bool:
+        ttl = settings.LEADERBOARD_CACHE_TTL.total_seconds()
+        return monotonic() - self.loaded_at > ttl
+
+    def rank(self, entry: LeaderboardEntry) -> int:
+        """1-based position of the entry on the leaderboard"""
+        return bisect_left(self._keys, entry.key) + 1
+
+    def entry_for_user(self, user_id: int) -> LeaderboardEntry | None:
+        return self._by_user.get(user_id)
+
+    def entry_for_token(self, token_id: int) -> LeaderboardEntry | None:
+        return self._by_token.get(token_id)
+
+    def rank_of_user(self, user_id: int) -> int | None:
+        entry = self.entry_for_user(user_id)
+        return self.rank(entry) if entry else None
+
+    def range_by_rank(self, start: int, stop: int) -> list[LeaderboardEntry]:
+        """Entries ranked from `start` up to but not including `stop`, both 1-based"""
+        keys = self._keys[max(start - 1, 0) : max(stop - 1, 0)]
+        return [self._entries[entry_id] for _, entry_id in keys]
+
+    def top(self, n: int) -> list[LeaderboardEntry]:
+        return self.range_by_rank(1, n + 1)
+
+    @property
+    def distribution(self) -> ScoreDistribution:
+        if self._distribution is None:
+            # keys are sorted by score descending, so flip them for ascending scores
+            scores = [-key[0] for key in reversed(self._keys)]
+            self._distribution = ScoreDistribution(scores)
+        return self._distribution
+
+    def update(self, entry: LeaderboardEntry, updated_at: datetime | None = None):
+        """Inserts a new entry or moves an existing one to its new score"""
+        with _lock:
+            if updated_at and (
+                self.last_modified is None or updated_at > self.last_modified
+            ):
+                self.last_modified = updated_at
+            rank = len(self._keys) + 1
+            if old := self._entries.get(entry.id):
+                rank = bisect_left(self._keys, old.key)
+                del self._keys[rank]
+                rank += 1
+            insort(self._keys, entry.key)
+
+            if min(rank, self.rank(entry)) <= settings.LEADERBOARD_PRERENDER_SIZE:
+                self.rendered = {}
+            self._entries[entry.id] = entry
+            self._by_user[entry.user_id] = entry
+            self._by_token[entry.token_id] = entry
+            self._distribution = None
+
+
+class LeaderboardRows:
+    """
+    Lazy sequence of `PlayerHighScore`s in leaderboard order. Slicing only fetches the
+    rows in the slice by primary key, so it can be handed straight to a paginator.
+    """
+
+    def __init__(self, leaderboard: GameLeaderboard):
+        self.leaderboard = leaderboard
+
+    def __len__(self) -> int:
+        return len(self.leaderboard)
+
+    def __getitem__(self, index: slice) -> list[PlayerHighScore]:
+        assert isinstance(index, slice) and index.step is None, "only slices supported"
+        start = (index.start or 0) + 1
+        stop = (len(self) if index.stop is None else index.stop) + 1
+        ids = [entry.id for entry in self.leaderboard.range_by_rank(start, stop)]
+        rows = PlayerHighScore.objects.select_related("user").in_bulk(ids)
+        return [rows[entry_id] for entry_id in ids if entry_id in rows]
+
+
+def get_leaderboard(game_id: int) -> GameLeaderboard:
+    """Gets the leaderboard for a game, loading it if needed. Raises `Game.DoesNotExist`."""
+    sync_leaderboards()
+    leaderboard = _leaderboards.get(game_id)
+    if leaderboard is None or leaderboard.is_stale:
+        leaderboard = load_leaderboard(game_id)
+    return leaderboard
+
+
+def load_leaderboard(game_id: int) -> GameLeaderboard:
+    if not Game.objects.filter(id=game_id).exists():
+        raise Game.DoesNotExist()
+
+    rows = PlayerHighScore.objects.filter(game_id=game_id).values_list(
+        "id", "user_id", "token_id", "score", "updated_at"
+    )
+    entries, last_modified = [], None
+    for *row, updated_at in rows.iterator():
+        entries.append(LeaderboardEntry(*row))
+        if last_modified is None or updated_at > last_modified:
+            last_modified = updated_at
+    leaderboard = GameLeaderboard(game_id, entries, last_modified)
+
+    with _lock:
+        _leaderboards[game_id] = leaderboard
+    return leaderboard
+
+
+def record_high_score(phs: PlayerHighScore):
+    record_high_scores([phs])
+
+
+def record_high_scores(high_scores: list[PlayerHighScore]):
+    """
+    Records new or raised high scores for every process's leaderboards, and applies them
+    to this process's leaderboards and live streams once committed
+    """
+    if not high_scores:
+        return
+
+    changes = LeaderboardChange.objects.bulk_create(
+        LeaderboardChange(
+            game_id=phs.game_id,
+            high_score_id=phs.id,
+            user_id=phs.user_id,
+            token_id=phs.token_id,
+            score=phs.score,
+            updated_at=phs.updated_at,
+        )
+        for phs in high_scores
+    )
+    transaction.on_commit(lambda: [apply_change(change) for change in changes])
+
+
+def sync_leaderboards() -> bool:
+    """
+    Applies high score changes recorded by other processes, at most once per
+    `LEADERBOARD_SYNC_INTERVAL`. Changes are read back from a little before the last sync
+    so ones that committed late aren't skipped, applying one twice does nothing. Returns
+    whether the db was read.
+    """
+    global _synced_at, _synced_at_monotonic
+
+    interval = settings.LEADERBOARD_SYNC_INTERVAL.total_seconds()
+    if monotonic() - _synced_at_monotonic < interval:
+        return False
+    if not _sync_lock.acquire(blocking=False):
+        return False
+    try:
+        # boards loaded from here on already have everything committed before now
+        since, _synced_at = _synced_at, now()
+        _synced_at_monotonic = monotonic()
+        if since is None:
+            return False
+
+        changes = LeaderboardChange.objects.filter(
+            created_at__gte=since - settings.LEADERBOARD_SYNC_LOOKBACK
+        ).order_by("id")
+        for change in changes:
+            apply_change(change)
+        return True
+    finally:
+        _sync_lock.release()
+
+
+def apply_change(change: LeaderboardChange):
+    """
+    Applies a high score change to the in-process leaderboard and publishes it to any
+    live streams on the game, changes that were already applied are skipped
+    """
+    entry = LeaderboardEntry(
+        change.high_score_id, change.user_id, change.token_id, change.score
+    )
+
+    leaderboard, previous = _leaderboards.get(change.game_id), None
+    if leaderboard:
+        previous = leaderboard.entry_for_user(change.user_id)
+        if previous and previous.score >= change.score:
+            return
+    elif has_subscribers(change.game_id):
+        # live streams need ranks, a freshly loaded board already has this change
+        try:
+            leaderboard = load_leaderboard(change.game_id)
+        except Game.DoesNotExist:
+            return
+    else:
+        return
+
+    previous_rank = leaderboard.rank(previous) if previous else None
+    leaderboard.update(entry, change.updated_at)
+
+    if has_subscribers(change.game_id):
+        event = LeaderboardEvent(
+            id=entry.id,
+            user_id=entry.user_id,
+            token_id=entry.token_id,
+            score=entry.score,
+            rank=leaderboard.rank(entry),
+            previous_score=previous.score if previous else None,
+            previous_rank=previous_rank,
+        )
+        publish(change.game_id, event)
+
+
+def clear_leaderboards():
+    global _synced_at, _synced_at_monotonic
+
+    with _lock:
+        _leaderboards.clear()
+        _synced_at, _synced_at_monotonic = None, 0.0
@@ -0,0 +1,60 @@
+from secrets import token_hex
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from eth_account import Account
+from web3 import Web3
+
+from games.helpers import sign_score
+
+
+def sign_typed_data(
+    name: str, game_address: str, signing_key: str, player: str, score: int, nonce: str
+) -> str:
+    """Signs through `Account.sign_typed_data`, how scores were signed before `ScoreSigner`"""
+    domain_data = {
+        "name": name,
+        "version": "1",
+        "chainId": int(settings.APP_CHAIN_ID),
+        "verifyingContract": Web3.to_checksum_address(game_address),
+    }
+    message_types = {
+        "VerifiedScore": [
+            {"name": "player", "type": "address"},
+            {"name": "score", "type": "uint256"},
+            {"name": "nonce", "type": "bytes32"},
+        ]
+    }
+    message_data = {"player": player, "score": score, "nonce": nonce}
+    signed = Account.sign_typed_data(
+        signing_key, domain_data, message_types, message_data
+    )
+    return f"0x{signed.signature.hex()}"
+
+
+class Command(BaseCommand):
+    help = "Benchmarks score signing with eth_account against the cached ScoreSigner"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-n", type=int, default=2000, help="Signatures per run")
+
+    def handle(self, *args, **options):
+        game = ("Benchmark", f"0x{token_hex(20)}", f"0x{token_hex(32)}")
+        scores = [
+            (f"0x{token_hex(20)}", i * 100, f"0x{token_hex(32)}")
+            for i in range(options["n"])
+        ]
+
+        results = {}
+        for label, sign in [
+            ("sign_typed_data", sign_typed_data),
+            ("ScoreSigner", sign_score),
+        ]:
+            start = perf_counter()
+            results[label] = [sign(*game, *score) for score in scores]
+            rate = len(scores) / (perf_counter() - start)
+            self.stdout.write(f"{label:>16}: {rate:,.0f} signatures/s")
+
+        assert results["sign_typed_data"] == results["ScoreSigner"], "signatures differ"
+        self.stdout.write("Signatures are identical")
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Exists, OuterRef
+from django.utils.timezone import now
+
+from games.models import ConsumedNonce, PlayerScore
+
+
+class Command(BaseCommand):
+    help = "Deletes old consumed nonces that no stored score carries, run on a schedule"
+
+    def handle(self, *args, **options):
+        cutoff = now() - settings.CONSUMED_NONCE_RETENTION
+        # consuming a nonce deletes its scores, so the rest only guard against scores
+        # that were stored after their nonce was consumed
+        nonces = ConsumedNonce.objects.filter(created_at__lt=cutoff).exclude(
+            Exists(
+                PlayerScore.objects.filter(
+                    game_id=OuterRef("game_id"), nonce=OuterRef("nonce")
+                )
+            )
+        )
+
+        # delete in chunks to keep each statement short
+        total = 0
+        while ids := list(
+            nonces.values_list("id", flat=True)[
+                : settings.CONSUMED_NONCE_PRUNE_CHUNK_SIZE
+            ]
+        ):
+            deleted, _ = ConsumedNonce.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(f"Pruned {total} consumed nonces")
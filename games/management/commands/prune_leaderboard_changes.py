@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from games.models import LeaderboardChange
+
+
+class Command(BaseCommand):
+    help = "Deletes leaderboard changes every process has had time to sync, run on a schedule"
+
+    def handle(self, *args, **options):
+        cutoff = now() - settings.LEADERBOARD_CHANGE_RETENTION
+        changes = LeaderboardChange.objects.filter(created_at__lt=cutoff)
+
+        # delete in chunks to keep each statement short
+        total = 0
+        while ids := list(
+            changes.values_list("id", flat=True)[
+                : settings.LEADERBOARD_CHANGE_PRUNE_CHUNK_SIZE
+            ]
+        ):
+            deleted, _ = LeaderboardChange.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(f"Pruned {total} leaderboard changes")
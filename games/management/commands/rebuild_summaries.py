@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from games.models import PlayerSummary
+
+
+class Command(BaseCommand):
+    help = "Recomputes player summaries from their high scores, after bulk writes or deletes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user", type=int, action="append", help="User id, defaults to all users"
+        )
+
+    def handle(self, *args, **options):
+        PlayerSummary.rebuild(options["user"])
+        self.stdout.write("Rebuilt player summaries")
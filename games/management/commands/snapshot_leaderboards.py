@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from games.models import Game
+from games.snapshots import take_snapshot
+
+
+class Command(BaseCommand):
+    help = "Snapshots game leaderboards, run on a schedule for periodic snapshots"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--game", type=int, action="append", help="Game id, defaults to all games"
+        )
+        parser.add_argument(
+            "--block", type=int, help="Block number to tag the snapshot with"
+        )
+
+    def handle(self, *args, **options):
+        games = Game.objects.all()
+        if options["game"]:
+            games = games.filter(id__in=options["game"])
+
+        for game in games:
+            snapshot = take_snapshot(game.id, block_number=options["block"])
+            self.stdout.write(
+                f"Snapshotted {game.name}: {snapshot.size} players, "
+                f"{len(snapshot.user_ids) + len(snapshot.scores) + len(snapshot.token_ids)} bytes"
+            )
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0002_alter_game_url"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="playerhighscore",
+            index=models.Index(
+                fields=["game", "-score", "id"],
+                include=("user", "token_id"),
+                name="phs_game_score_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="playerhighscore",
+            index=models.Index(fields=["game", "token_id"], name="phs_game_token_idx"),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def rank_high_scores(apps, schema_editor):
+    PlayerHighScore = apps.get_model("games", "PlayerHighScore")
+    game_ids = PlayerHighScore.objects.values_list("game_id", flat=True).distinct()
+    for game_id in game_ids:
+        ids = (
+            PlayerHighScore.objects.filter(game_id=game_id)
+            .order_by("-score", "id")
+            .values_list("id", flat=True)
+        )
+        PlayerHighScore.objects.bulk_update(
+            [PlayerHighScore(id=id, rank=rank) for rank, id in enumerate(ids, start=1)],
+            ["rank"],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0003_playerhighscore_leaderboard_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="playerhighscore",
+            name="phs_game_score_idx",
+        ),
+        migrations.AddField(
+            model_name="playerhighscore",
+            name="rank",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="playerhighscore",
+            index=models.Index(
+                fields=["game", "-score", "id"],
+                include=("user", "token_id", "rank"),
+                name="phs_game_score_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="playerhighscore",
+            index=models.Index(fields=["game", "rank"], name="phs_game_rank_idx"),
+        ),
+        migrations.RunPython(rank_high_scores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def summarize_high_scores(apps, schema_editor):
+    PlayerHighScore = apps.get_model("games", "PlayerHighScore")
+    PlayerSummary = apps.get_model("games", "PlayerSummary")
+    totals = (
+        PlayerHighScore.objects.values("user_id")
+        .annotate(
+            total_score=Sum("score"),
+            games_played=Count("id"),
+            best_rank=Min("rank"),
+        )
+        .order_by()
+    )
+    PlayerSummary.objects.bulk_create(
+        [PlayerSummary(**total) for total in totals.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0004_playerhighscore_rank"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PlayerSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_score", models.BigIntegerField(default=0)),
+                ("games_played", models.PositiveIntegerField(default=0)),
+                ("best_rank", models.PositiveIntegerField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="summary",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["-total_score", "id"],
+                        include=("user",),
+                        name="summary_total_score_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(summarize_high_scores, migrations.RunPython.noop),
+    ]
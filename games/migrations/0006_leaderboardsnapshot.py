@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0005_playersummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="LeaderboardSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("block_number", models.BigIntegerField(blank=True, null=True)),
+                ("size", models.PositiveIntegerField()),
+                ("user_ids", models.BinaryField()),
+                ("scores", models.BinaryField()),
+                ("token_ids", models.BinaryField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="games.game"
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["game", "-created_at"], name="snapshot_game_created_idx"
+                    ),
+                    models.Index(
+                        fields=["game", "-block_number"], name="snapshot_game_block_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0006_leaderboardsnapshot"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="playerscore",
+            name="nonce",
+            field=models.CharField(blank=True, default="", max_length=66),
+        ),
+        migrations.AddField(
+            model_name="playerscore",
+            name="signature",
+            field=models.CharField(blank=True, default="", max_length=132),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:49
+
+from hashlib import sha256
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from hexbytes import HexBytes
+
+
+def fill_score_nonces(apps, schema_editor):
+    # scores signed before signatures were stored still need their nonce to be cleared
+    PlayerScore = apps.get_model("games", "PlayerScore")
+    batch = []
+    for score in PlayerScore.objects.filter(nonce="").only("id").iterator():
+        score.nonce = f"0x{sha256(HexBytes(score.id)).hexdigest()}"
+        batch.append(score)
+        if len(batch) == 1000:
+            PlayerScore.objects.bulk_update(batch, ["nonce"])
+            batch = []
+    PlayerScore.objects.bulk_update(batch, ["nonce"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0007_playerscore_signature"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConsumedNonce",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("nonce", models.CharField(max_length=66)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="playerscore",
+            index=models.Index(fields=["game", "nonce"], name="score_game_nonce_idx"),
+        ),
+        migrations.AddField(
+            model_name="consumednonce",
+            name="game",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="games.game"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="consumednonce",
+            constraint=models.UniqueConstraint(
+                fields=("game", "nonce"), name="unique_game_consumed_nonce"
+            ),
+        ),
+        migrations.RunPython(fill_score_nonces, migrations.RunPython.noop),
+    ]
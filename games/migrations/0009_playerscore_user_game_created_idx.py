@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0008_consumednonce"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="playerscore",
+            index=models.Index(
+                fields=["user", "game", "created_at"],
+                name="score_user_game_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_game_server_group(apps, schema_editor):
+    Group = apps.get_model("auth", "Group")
+    Group.objects.get_or_create(name=settings.GAME_SERVER_GROUP)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("games", "0009_playerscore_user_game_created_idx"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_game_server_group, migrations.RunPython.noop),
+    ]
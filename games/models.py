@@ -1,5 +1,12 @@
+from bisect import bisect_left
+from datetime import datetime
+from itertools import batched
+
 from django.conf import settings
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import Coalesce, Least
+from django.utils.timezone import now
 
 from utils.rest_framework.validators import bytes32_hex_validator, eth_address_validator
 
@@ -31,11 +38,30 @@ class Game(models.Model):
     def save(self, *args, **kwargs):
         self.eth_address = self.eth_address.lower()
         self.nft_address = self.nft_address.lower()
-        return super().save(*args, **kwargs)
+
+        # stored score signatures are bound to the game's domain and key
+        signed_fields = ("name", "eth_address", "signing_key")
+        previous = Game.objects.filter(pk=self.pk).values_list(*signed_fields).first()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if previous and previous != tuple(getattr(self, f) for f in signed_fields):
+                PlayerScore.objects.filter(game=self).update(signature="")
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        # high scores are cascade deleted without `PlayerHighScore.delete()`
+        with transaction.atomic():
+            user_ids = list(
+                PlayerHighScore.objects.filter(game=self).values_list(
+                    "user_id", flat=True
+                )
+            )
+            deleted = super().delete(*args, **kwargs)
+            PlayerSummary.rebuild(user_ids)
+        return deleted
+
 
 class PlayerHighScore(models.Model):
     """
@@ -48,18 +74,578 @@ class PlayerHighScore(models.Model):
         constraints = [
             models.UniqueConstraint(fields=["user", "game"], name="unique_user_game"),
         ]
+        indexes = [
+            # leaderboards, covering so pages can be served from the index alone
+            models.Index(
+                fields=["game", "-score", "id"],
+                name="phs_game_score_idx",
+                include=["user", "token_id", "rank"],
+            ),
+            # rank windows
+            models.Index(fields=["game", "rank"], name="phs_game_rank_idx"),
+            # trophy metadata lookups
+            models.Index(fields=["game", "token_id"], name="phs_game_token_idx"),
+        ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     score = models.BigIntegerField(default=0)
     token_id = models.BigIntegerField()
+    # 1-based position on the game leaderboard, maintained on save
+    rank = models.PositiveIntegerField(default=0, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # score as last loaded from or saved to the db
+    _saved_score: int | None = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._saved_score = instance.__dict__.get("score")
+        return instance
+
     def __str__(self):
         return f"{self.user.username} - {self.game.name}"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and self.score == self._saved_score:
+            # ranks are only written by `update_rank`, never write back a stale one
+            kwargs.setdefault(
+                "update_fields",
+                [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key and field.name != "rank"
+                ],
+            )
+            return super().save(*args, **kwargs)
+
+        # the score moved, so move the rank and the player's totals with it
+        with transaction.atomic():
+            self.lock_leaderboard(self.game_id)
+            previous_rank = None if adding else self._current_rank()
+            super().save(*args, **kwargs)
+            self.update_rank(previous_rank)
+            PlayerSummary.record(
+                self.user_id,
+                score=self.score - (self._saved_score or 0),
+                games_played=int(adding),
+                rank=self.rank,
+            )
+
+        self._saved_score = self.score
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.lock_leaderboard(self.game_id)
+            rank = self._current_rank()
+            deleted = super().delete(*args, **kwargs)
+            PlayerHighScore.objects.filter(game_id=self.game_id, rank__gt=rank).update(
+                rank=F("rank") - 1
+            )
+            # the best rank may have been on this leaderboard
+            PlayerSummary.rebuild([self.user_id])
+        return deleted
+
+    @staticmethod
+    def lock_leaderboard(game_id: int):
+        """Serializes rank changes on a game leaderboard until the transaction ends"""
+        list(Game.objects.select_for_update().filter(id=game_id).values_list("id"))
+
+    @classmethod
+    def rerank(cls, game_id: int):
+        """Recomputes every rank on a game leaderboard, for writes that skip `save()`"""
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cls.lock_leaderboard(game_id)
+            cursor.execute(
+                f"""
+                UPDATE {table} SET rank = ranked.position
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY score DESC, id) AS position
+                    FROM {table}
+                    WHERE game_id = %s
+                ) AS ranked
+                WHERE {table}.id = ranked.id AND {table}.rank <> ranked.position
+                """,
+                [game_id],
+            )
+
+    @classmethod
+    def upsert_many(
+        cls, rows: list[tuple[int, int, int, int]]
+    ) -> list["PlayerHighScore"]:
+        """
+        Inserts or raises high scores from `(user_id, game_id, token_id, score)` rows with a
+        single `INSERT ... ON CONFLICT` that keeps the greater of the stored and new score,
+        so concurrent writers can never lower one. Ranks are then moved for the span each
+        leaderboard changed over and the player totals in one statement, so the number of
+        queries doesn't grow with the rows. The high scores that changed are returned.
+        """
+        # fold rows for the same player and game, keeping the first token id
+        folded: dict[tuple[int, int], tuple[int, int]] = {}
+        for user_id, game_id, token_id, score in rows:
+            if (user_id, game_id) in folded:
+                token_id, previous_score = folded[(user_id, game_id)]
+                score = max(score, previous_score)
+            folded[(user_id, game_id)] = (token_id, score)
+        if not folded:
+            return []
+
+        game_ids = sorted({game_id for _, game_id in folded})
+        with transaction.atomic():
+            # lock the touched leaderboards in id order so batches can't deadlock
+            list(
+                Game.objects.select_for_update()
+                .filter(id__in=game_ids)
+                .order_by("id")
+                .values_list("id")
+            )
+            previous = {
+                (user_id, game_id): (score, rank)
+                for user_id, game_id, score, rank in cls.objects.filter(
+                    game_id__in=game_ids,
+                    user_id__in={user_id for user_id, _ in folded},
+                ).values_list("user_id", "game_id", "score", "rank")
+            }
+            high_scores = [
+                phs
+                for chunk in batched(folded.items(), 500)
+                for phs in cls._upsert(chunk)
+            ]
+            changed = [
+                phs
+                for phs in high_scores
+                if phs.score > previous.get((phs.user_id, phs.game_id), (-1,))[0]
+            ]
+            if not changed:
+                return []
+
+            previous_ranks = {
+                phs.id: previous[(phs.user_id, phs.game_id)][1]
+                for phs in changed
+                if (phs.user_id, phs.game_id) in previous
+            }
+            by_game: dict[int, list[PlayerHighScore]] = {}
+            for phs in changed:
+                by_game.setdefault(phs.game_id, []).append(phs)
+            for game_id, game_changed in by_game.items():
+                cls._shift_ranks(game_id, game_changed, previous_ranks)
+            cls._rank_changed(changed)
+
+            # fold the changes into one set of deltas per player
+            deltas: dict[int, tuple[int, int, int]] = {}
+            for phs in changed:
+                previous_score = previous.get((phs.user_id, phs.game_id), (None,))[0]
+                score, games_played, rank = deltas.get(phs.user_id, (0, 0, phs.rank))
+                deltas[phs.user_id] = (
+                    score + phs.score - (previous_score or 0),
+                    games_played + int(previous_score is None),
+                    min(rank, phs.rank),
+                )
+            PlayerSummary.record_many(deltas)
+
+        return changed
+
+    @classmethod
+    def _shift_ranks(
+        cls,
+        game_id: int,
+        changed: list["PlayerHighScore"],
+        previous_ranks: dict[int, int],
+    ) -> int:
+        """
+        Moves the ranks of the unchanged high scores a batch of changes passed, in one update
+        over the span the changes moved through. Each moves down for every change now ahead
+        of it and up for every change that was ahead of it. Without new players nothing
+        behind the lowest previous rank moves, so the span ends there. Returns how many
+        ranks moved.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        best = min(changed, key=lambda x: (-x.score, x.id))
+        old_ranks = [
+            previous_ranks[phs.id] for phs in changed if phs.id in previous_ranks
+        ]
+        inserted = len(old_ranks) < len(changed)
+
+        sql = f"""
+            UPDATE {table} SET rank = rank
+                + (
+                    SELECT COUNT(*)
+                    FROM (VALUES {", ".join(["(%s, %s)"] * len(changed))}) AS passed
+                    WHERE passed.column1 > {table}.score
+                        OR (passed.column1 = {table}.score AND passed.column2 < {table}.id)
+                )
+        """
+        params = [value for phs in changed for value in (phs.score, phs.id)]
+        if old_ranks:
+            sql += f"""
+                - (
+                    SELECT COUNT(*)
+                    FROM (VALUES {", ".join(["(%s)"] * len(old_ranks))}) AS moved
+                    WHERE moved.column1 < {table}.rank
+                )
+            """
+            params += old_ranks
+        sql += f"""
+            WHERE game_id = %s
+                AND id NOT IN ({", ".join(["%s"] * len(changed))})
+                AND (score < %s OR (score = %s AND id > %s))
+        """
+        params += [
+            game_id,
+            *(phs.id for phs in changed),
+            best.score,
+            best.score,
+            best.id,
+        ]
+        if not inserted:
+            sql += " AND rank < %s"
+            params.append(max(old_ranks))
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    @classmethod
+    def _rank_changed(cls, changed: list["PlayerHighScore"]):
+        """
+        Ranks changed high scores from the nearest unchanged high score ahead of each, once
+        the unchanged ones have been shifted, plus the changes between the two
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        ids = [phs.id for phs in changed]
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT changed.id, nearest.rank, nearest.score, nearest.id
+                FROM {table} AS changed
+                LEFT JOIN {table} AS nearest ON nearest.id = (
+                    SELECT ahead.id FROM {table} AS ahead
+                    WHERE ahead.game_id = changed.game_id
+                        AND ahead.id NOT IN ({placeholders})
+                        AND (
+                            ahead.score > changed.score
+                            OR (ahead.score = changed.score AND ahead.id < changed.id)
+                        )
+                    ORDER BY ahead.score, ahead.id DESC
+                    LIMIT 1
+                )
+                WHERE changed.id IN ({placeholders})
+                """,
+                ids + ids,
+            )
+            nearest = {row[0]: row[1:] for row in cursor.fetchall()}
+
+        keys: dict[int, list[tuple[int, int]]] = {}
+        for phs in changed:
+            keys.setdefault(phs.game_id, []).append((-phs.score, phs.id))
+        for game_keys in keys.values():
+            game_keys.sort()
+
+        for phs in changed:
+            game_keys = keys[phs.game_id]
+            index = bisect_left(game_keys, (-phs.score, phs.id))
+            rank, score, id = nearest[phs.id]
+            if rank is None:
+                phs.rank = index + 1
+            else:
+                phs.rank = rank + index - bisect_left(game_keys, (-score, id)) + 1
+
+        cls.objects.bulk_update(changed, ["rank"], batch_size=1000)
+
+    @classmethod
+    def _upsert(cls, rows) -> list["PlayerHighScore"]:
+        table = connection.ops.quote_name(cls._meta.db_table)
+        greatest = "GREATEST" if connection.vendor == "postgresql" else "MAX"
+        timestamp = connection.ops.adapt_datetimefield_value(now())
+        params = [
+            value
+            for (user_id, game_id), (token_id, score) in rows
+            for value in (user_id, game_id, token_id, score, timestamp, timestamp)
+        ]
+        sql = f"""
+            INSERT INTO {table}
+                (user_id, game_id, token_id, score, rank, created_at, updated_at)
+            VALUES {", ".join(["(%s, %s, %s, %s, 0, %s, %s)"] * len(rows))}
+            ON CONFLICT (user_id, game_id) DO UPDATE SET
+                score = {greatest}({table}.score, EXCLUDED.score),
+                updated_at = CASE WHEN EXCLUDED.score > {table}.score
+                    THEN EXCLUDED.updated_at ELSE {table}.updated_at END
+            RETURNING id, user_id, game_id, token_id, score, rank, created_at, updated_at
+        """
+        return list(cls.objects.raw(sql, params))
+
+    def update_rank(self, previous_rank: int | None):
+        """
+        Moves this high score to its new place on the leaderboard, only shifting the ranks
+        of the high scores between its old and new place. `previous_rank` is None for new
+        high scores. Callers must hold the leaderboard lock.
+        """
+        nearest_rank = (
+            self.ahead().order_by("score", "-id").values_list("rank", flat=True).first()
+        ) or 0
+        others = PlayerHighScore.objects.filter(game_id=self.game_id).exclude(
+            id=self.id
+        )
+
+        if previous_rank is None:
+            # inserted, push everyone behind down
+            self.rank = nearest_rank + 1
+            others.filter(rank__gte=self.rank).update(rank=F("rank") + 1)
+        elif nearest_rank < previous_rank:
+            # moved up, push down the ones passed
+            self.rank = nearest_rank + 1
+            others.filter(rank__gte=self.rank, rank__lt=previous_rank).update(
+                rank=F("rank") + 1
+            )
+        else:
+            # moved down, pull up the ones passed
+            self.rank = nearest_rank
+            others.filter(rank__gt=previous_rank, rank__lte=self.rank).update(
+                rank=F("rank") - 1
+            )
+
+        PlayerHighScore.objects.filter(id=self.id).update(rank=self.rank)
+
+    def _current_rank(self) -> int:
+        return (
+            PlayerHighScore.objects.filter(id=self.id)
+            .values_list("rank", flat=True)
+            .get()
+        )
+
+    def ahead(self) -> models.QuerySet["PlayerHighScore"]:
+        """High scores ranked above this one, leaderboards order by score with ties broken by id"""
+        return PlayerHighScore.objects.filter(game_id=self.game_id).filter(
+            Q(score__gt=self.score) | Q(score=self.score, id__lt=self.id)
+        )
+
+
+class PlayerSummary(models.Model):
+    """
+    Model to capture a player's totals across every game, basically, this is the global leaderboard.
+    This is kept up to date incrementally as high scores are saved and should never be written to directly.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-total_score", "id"],
+                name="summary_total_score_idx",
+                include=["user"],
+            ),
+        ]
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL, related_name="summary", on_delete=models.CASCADE
+    )
+    total_score = models.BigIntegerField(default=0)
+    games_played = models.PositiveIntegerField(default=0)
+    # best rank the player has reached on any game leaderboard
+    best_rank = models.PositiveIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.total_score}"
+
+    @classmethod
+    def record(
+        cls, user_id: int, score: int, games_played: int, rank: int | None = None
+    ):
+        """Applies a change in one of the player's high scores to their totals"""
+        summary, _ = cls.objects.get_or_create(user_id=user_id)
+        updates = {
+            "total_score": F("total_score") + score,
+            "games_played": F("games_played") + games_played,
+            "updated_at": now(),
+        }
+        if rank is not None:
+            updates["best_rank"] = Least(Coalesce("best_rank", rank), rank)
+        cls.objects.filter(id=summary.id).update(**updates)
+        PlayerSummaryVersion.bump()
+
+    @classmethod
+    def record_many(cls, deltas: dict[int, tuple[int, int, int]]):
+        """
+        Applies `(score, games_played, rank)` changes keyed by player to their totals with
+        one `INSERT ... ON CONFLICT` per chunk, the bulk version of `record`.
+        """
+        table = connection.ops.quote_name(cls._meta.db_table)
+        least = "LEAST" if connection.vendor == "postgresql" else "MIN"
+        timestamp = connection.ops.adapt_datetimefield_value(now())
+        for chunk in batched(deltas.items(), 500):
+            params = [
+                value
+                for user_id, (score, games_played, rank) in chunk
+                for value in (user_id, score, games_played, rank, timestamp, timestamp)
+            ]
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    INSERT INTO {table} (
+                        user_id, total_score, games_played, best_rank,
+                        created_at, updated_at
+                    )
+                    VALUES {", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(chunk))}
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        total_score = {table}.total_score + EXCLUDED.total_score,
+                        games_played = {table}.games_played + EXCLUDED.games_played,
+                        best_rank = {least}(
+                            COALESCE({table}.best_rank, EXCLUDED.best_rank),
+                            EXCLUDED.best_rank
+                        ),
+                        updated_at = EXCLUDED.updated_at
+                    """,
+                    params,
+                )
+        if deltas:
+            PlayerSummaryVersion.bump()
+
+    @classmethod
+    def rebuild(cls, user_ids: list[int] | None = None):
+        """
+        Recomputes players' totals from their current high scores, for writes that skip
+        `PlayerHighScore.save()` such as queryset deletes. Rebuilds everyone by default.
+        The best rank is the best ever reached, so it is only ever lowered to a current rank.
+        """
+        high_scores = PlayerHighScore.objects.all()
+        summaries = cls.objects.all()
+        if user_ids is not None:
+            high_scores = high_scores.filter(user_id__in=user_ids)
+            summaries = summaries.filter(user_id__in=user_ids)
+
+        totals = {
+            row["user_id"]: row
+            for row in high_scores.values("user_id")
+            .annotate(
+                total_score=Sum("score"),
+                games_played=Count("id"),
+                best_rank=Min("rank"),
+            )
+            .order_by()
+        }
+
+        best_ranks = dict(summaries.values_list("user_id", "best_rank"))
+
+        # players left without high scores are reset, apart from the best rank they reached
+        empty = {"total_score": 0, "games_played": 0, "best_rank": None}
+        timestamp = now()
+        cls.objects.bulk_create(
+            [
+                cls(
+                    user_id=user_id,
+                    total_score=totals.get(user_id, empty)["total_score"],
+                    games_played=totals.get(user_id, empty)["games_played"],
+                    best_rank=min(
+                        (
+                            rank
+                            for rank in (
+                                best_ranks.get(user_id),
+                                totals.get(user_id, empty)["best_rank"],
+                            )
+                            if rank is not None
+                        ),
+                        default=None,
+                    ),
+                    updated_at=timestamp,
+                )
+                for user_id in set(totals) | set(best_ranks)
+            ],
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=["total_score", "games_played", "best_rank", "updated_at"],
+            batch_size=1000,
+        )
+        PlayerSummaryVersion.bump()
+
+
+class PlayerSummaryVersion(models.Model):
+    """
+    Model to capture a single version number for the player summaries, bumped on every write
+    to them, so the global leaderboard can be versioned without reading them.
+    """
+
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return str(self.version)
+
+    @classmethod
+    def bump(cls):
+        if not cls.objects.filter(id=1).update(
+            version=F("version") + 1, updated_at=now()
+        ):
+            cls.objects.get_or_create(id=1, defaults={"version": 1})
+
+    @classmethod
+    def current(cls) -> tuple[int, datetime | None]:
+        """The summaries' version and when it last changed"""
+        row = cls.objects.filter(id=1).values_list("version", "updated_at").first()
+        return row or (0, None)
+
+
+class LeaderboardChange(models.Model):
+    """
+    Model to capture new and raised high scores for the web processes to pick up, so boards
+    and live streams follow scores indexed elsewhere, see `games.leaderboard`. Rows are only
+    read back for a short while and are pruned on a schedule.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="change_created_idx"),
+        ]
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    high_score = models.ForeignKey(PlayerHighScore, on_delete=models.CASCADE)
+    # the high score as it was changed, so changes can be applied without reading it
+    user_id = models.BigIntegerField()
+    token_id = models.BigIntegerField()
+    score = models.BigIntegerField()
+    updated_at = models.DateTimeField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.game_id} - {self.high_score_id} - {self.score}"
+
+
+class LeaderboardSnapshot(models.Model):
+    """
+    Model to capture a game leaderboard at a point in time, e.g. for seasonal rewards.
+    The ordering is stored as compressed delta encoded arrays, see `games.snapshots`.
+    """
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["game", "-created_at"], name="snapshot_game_created_idx"
+            ),
+            models.Index(
+                fields=["game", "-block_number"], name="snapshot_game_block_idx"
+            ),
+        ]
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    block_number = models.BigIntegerField(null=True, blank=True)
+    size = models.PositiveIntegerField()
+    user_ids = models.BinaryField()
+    scores = models.BinaryField()
+    token_ids = models.BinaryField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.game.name} - {self.created_at}"
+
 
 class PlayerScore(models.Model):
     """
@@ -67,12 +653,49 @@ class PlayerScore(models.Model):
     This should never be created by a user but rather from a game app with extra logic around limiting score.
     """
 
+    class Meta:
+        indexes = [
+            # clearing scores consumed onchain
+            models.Index(fields=["game", "nonce"], name="score_game_nonce_idx"),
+            # a player's scores, in the order they are paged
+            models.Index(
+                fields=["user", "game", "created_at"],
+                name="score_user_game_created_idx",
+            ),
+        ]
+
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     game = models.ForeignKey(Game, on_delete=models.CASCADE)
     score = models.BigIntegerField()
 
+    # EIP-712 signature, filled in once the score is committed or on first request
+    nonce = models.CharField(max_length=66, blank=True, default="")
+    signature = models.CharField(max_length=132, blank=True, default="")
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.game.name} - {self.score}"
+
+
+class ConsumedNonce(models.Model):
+    """
+    Model to capture score nonces that have been used onchain, a signed score can only be used once.
+    This should only be written to from webhooks.
+    """
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "nonce"], name="unique_game_consumed_nonce"
+            ),
+        ]
+
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    nonce = models.CharField(max_length=66)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.game.name} - {self.nonce}"
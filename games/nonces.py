@@ -0,0 +1,161 @@
+"""
+Score nonces consumed onchain. A signed score can only be used once, so every nonce the
+game contracts report as used is stored in `ConsumedNonce` and the scores it belongs to
+are deleted.
+
+Each worker process also keeps a Bloom filter of each game's consumed nonces, so checking
+the nonces of a batch of scores only reads the table for the few the filter can't rule
+out. Filters are sized from the number of nonces and read the ones recorded on other
+workers every `CONSUMED_NONCE_FILTER_TTL`, only loading the rows added since. A filter
+that outgrows its size is rebuilt twice as large. Nonces whose scores are gone are pruned
+after `CONSUMED_NONCE_RETENTION`, pruned nonces stay in loaded filters as positives the
+table rules out.
+"""
+
+import math
+import threading
+from collections.abc import Iterable
+from hashlib import blake2b
+from time import monotonic
+
+from django.conf import settings
+from django.db import transaction
+
+from games.helpers import score_nonce
+from games.models import ConsumedNonce, PlayerScore
+
+_lock = threading.Lock()
+_filters: dict[int, "NonceFilter"] = {}
+
+
+class NonceFilter:
+    """Bloom filter of a game's consumed nonces, it can give false positives but never false negatives"""
+
+    def __init__(self, nonces: Iterable[str] = (), size: int | None = None):
+        self.loaded_at = monotonic()
+        self.size = size or settings.CONSUMED_NONCE_FILTER_BITS
+        self.hashes = settings.CONSUMED_NONCE_FILTER_HASHES
+        self.bits = bytearray(self.size // 8)
+        self.count = 0
+        # id of the last `ConsumedNonce` loaded, later refreshes only read newer rows
+        self.last_id = 0
+        for nonce in nonces:
+            self.add(nonce)
+
+    def __contains__(self, nonce: str) -> bool:
+        return all(
+            self.bits[position // 8] & (1 << (position % 8))
+            for position in self._positions(nonce)
+        )
+
+    @staticmethod
+    def size_for(count: int) -> int:
+        """Bits for `count` nonces with room to double, at least the configured size"""
+        bits = 2 * count * settings.CONSUMED_NONCE_FILTER_HASHES / math.log(2)
+        return max(
+            settings.CONSUMED_NONCE_FILTER_BITS, 2 ** math.ceil(math.log2(bits or 1))
+        )
+
+    @property
+    def capacity(self) -> int:
+        """Nonces the filter holds before its false positive rate climbs past the designed one"""
+        return int(self.size * math.log(2) / self.hashes)
+
+    @property
+    def is_stale(self) -> bool:
+        ttl = settings.CONSUMED_NONCE_FILTER_TTL.total_seconds()
+        return monotonic() - self.loaded_at > ttl
+
+    def add(self, nonce: str):
+        with _lock:
+            for position in self._positions(nonce):
+                self.bits[position // 8] |= 1 << (position % 8)
+            self.count += 1
+
+    def load(self, rows: Iterable[tuple[int, str]]):
+        """Adds `(id, nonce)` rows from `ConsumedNonce` in id order"""
+        for id, nonce in rows:
+            self.add(nonce)
+            self.last_id = id
+        self.loaded_at = monotonic()
+
+    def _positions(self, nonce: str) -> list[int]:
+        digest = blake2b(nonce.lower().encode(), digest_size=4 * self.hashes).digest()
+        return [
+            int.from_bytes(digest[i : i + 4], "big") % self.size
+            for i in range(0, len(digest), 4)
+        ]
+
+
+def get_nonce_filter(game_id: int) -> NonceFilter:
+    nonce_filter = _filters.get(game_id)
+    if nonce_filter is not None and nonce_filter.is_stale:
+        nonce_filter.load(_nonce_rows(game_id, after=nonce_filter.last_id))
+        if nonce_filter.count > nonce_filter.capacity:
+            nonce_filter = None
+    if nonce_filter is None:
+        nonces = ConsumedNonce.objects.filter(game_id=game_id)
+        nonce_filter = NonceFilter(size=NonceFilter.size_for(nonces.count()))
+        nonce_filter.load(_nonce_rows(game_id))
+        with _lock:
+            _filters[game_id] = nonce_filter
+    return nonce_filter
+
+
+def _nonce_rows(game_id: int, after: int = 0):
+    return (
+        ConsumedNonce.objects.filter(game_id=game_id, id__gt=after)
+        .order_by("id")
+        .values_list("id", "nonce")
+        .iterator()
+    )
+
+
+def consumed_nonces(game_id: int, nonces: list[str]) -> set[str]:
+    """The nonces that have been used onchain, only filter positives are read from the db"""
+    nonce_filter = get_nonce_filter(game_id)
+    candidates = [nonce for nonce in nonces if nonce in nonce_filter]
+    if not candidates:
+        return set()
+    return set(
+        ConsumedNonce.objects.filter(game_id=game_id, nonce__in=candidates).values_list(
+            "nonce", flat=True
+        )
+    )
+
+
+def consumed_scores(scores: list[PlayerScore]) -> list[PlayerScore]:
+    """The scores whose nonce has been used onchain"""
+    by_game: dict[int, dict[str, PlayerScore]] = {}
+    for score in scores:
+        nonce = score.nonce or score_nonce(score.id)
+        by_game.setdefault(score.game_id, {})[nonce] = score
+
+    return [
+        by_nonce[nonce]
+        for game_id, by_nonce in by_game.items()
+        for nonce in consumed_nonces(game_id, list(by_nonce))
+    ]
+
+
+def record_consumed_nonces(game_id: int, nonces: list[str]) -> int:
+    """Stores consumed nonces and deletes their scores, returns the number of scores deleted"""
+    nonces = [nonce.lower() for nonce in nonces]
+    ConsumedNonce.objects.bulk_create(
+        [ConsumedNonce(game_id=game_id, nonce=nonce) for nonce in nonces],
+        ignore_conflicts=True,
+    )
+    deleted, _ = PlayerScore.objects.filter(game_id=game_id, nonce__in=nonces).delete()
+
+    def apply():
+        if nonce_filter := _filters.get(game_id):
+            for nonce in nonces:
+                nonce_filter.add(nonce)
+
+    transaction.on_commit(apply)
+    return deleted
+
+
+def clear_nonce_filters():
+    with _lock:
+        _filters.clear()
@@ -0,0 +1,25 @@
+from api.pagination import KeysetPagination
+
+
+class LeaderboardCursorPagination(KeysetPagination):
+    """Seeks through a leaderboard on its `(score DESC, id)` key"""
+
+    ordering = ("-score", "id")
+
+
+class GlobalLeaderboardCursorPagination(KeysetPagination):
+    """Seeks through the global leaderboard on its `(total_score DESC, id)` key"""
+
+    ordering = ("-total_score", "id")
+
+
+class PlayerScoreCursorPagination(KeysetPagination):
+    """Seeks through a player's scores on their `(game, created_at, id)` key"""
+
+    ordering = ("game_id", "created_at", "id")
+
+
+class PlayerHighScoreCursorPagination(KeysetPagination):
+    """Seeks through a player's high scores on their `(game, id)` key"""
+
+    ordering = ("game_id", "id")
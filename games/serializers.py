@@ -1,12 +1,22 @@
+from django.conf import settings
 from rest_framework.serializers import (
     CharField,
+    DateTimeField,
+    FloatField,
     IntegerField,
     ListField,
     ModelSerializer,
     Serializer,
 )
 
-from games.models import Game, PlayerHighScore, PlayerScore
+from games.models import (
+    Game,
+    LeaderboardSnapshot,
+    PlayerHighScore,
+    PlayerScore,
+    PlayerSummary,
+)
+from utils.rest_framework.validators import eth_address_validator
 
 
 class GameSerializer(ModelSerializer):
@@ -28,6 +38,7 @@ class LeaderboardSerializer(ModelSerializer):
     class Meta:
         model = PlayerHighScore
         fields = [
+            "rank",
             "username",
             "eth_address",
             "score",
@@ -40,11 +51,82 @@ class LeaderboardSerializer(ModelSerializer):
     eth_address = CharField(source="user.eth_address")
 
 
+class GlobalLeaderboardSerializer(ModelSerializer):
+    class Meta:
+        model = PlayerSummary
+        fields = [
+            "username",
+            "eth_address",
+            "total_score",
+            "games_played",
+            "best_rank",
+            "updated_at",
+        ]
+
+    username = CharField(source="user.username")
+    eth_address = CharField(source="user.eth_address")
+
+
+class LeaderboardRankQuerySerializer(Serializer):
+    n = IntegerField(min_value=0, max_value=50, default=5)
+
+
+class LeaderboardRankSerializer(Serializer):
+    rank = IntegerField()
+    results = LeaderboardSerializer(many=True)
+
+
+class ScoreDistributionQuerySerializer(Serializer):
+    buckets = IntegerField(min_value=1, max_value=100, default=10)
+
+
+class HistogramBucketSerializer(Serializer):
+    min = IntegerField()
+    max = IntegerField()
+    count = IntegerField()
+
+
+class ScoreDistributionSerializer(Serializer):
+    count = IntegerField()
+    p50 = IntegerField(allow_null=True)
+    p90 = IntegerField(allow_null=True)
+    p99 = IntegerField(allow_null=True)
+    histogram = HistogramBucketSerializer(many=True)
+    rank = IntegerField(allow_null=True)
+    score = IntegerField(allow_null=True)
+    percentile = FloatField(allow_null=True)
+    top_percent = FloatField(allow_null=True)
+
+
+class LeaderboardSnapshotSerializer(ModelSerializer):
+    class Meta:
+        model = LeaderboardSnapshot
+        fields = ["id", "game", "block_number", "size", "created_at"]
+
+
+class LeaderboardSnapshotQuerySerializer(Serializer):
+    block = IntegerField(required=False)
+    timestamp = DateTimeField(required=False)
+
+
+class SnapshotEntrySerializer(Serializer):
+    rank = IntegerField()
+    username = CharField(allow_null=True)
+    eth_address = CharField(allow_null=True)
+    score = IntegerField()
+    token_id = IntegerField()
+
+
+class SnapshotRankQuerySerializer(Serializer):
+    eth_address = CharField(validators=[eth_address_validator])
+
+
 class PlayerHighScoreSerializer(ModelSerializer):
     class Meta:
         model = PlayerHighScore
         fields = [
             "game",
+            "rank",
             "score",
             "token_id",
             "created_at",
@@ -72,6 +154,24 @@ class ScoreIdSerializer(Serializer):
     ids = ListField(child=IntegerField())
 
 
+class ScoreBatchItemSerializer(Serializer):
+    player = CharField(validators=[eth_address_validator])
+    game = CharField(validators=[eth_address_validator])
+    score = IntegerField(min_value=0, max_value=2**63 - 1)
+
+
+class ScoreBatchSerializer(Serializer):
+    scores = ListField(
+        child=ScoreBatchItemSerializer(),
+        allow_empty=False,
+        max_length=settings.SCORE_BATCH_MAX_SIZE,
+    )
+
+
+class ScoreBatchResultSerializer(Serializer):
+    ids = ListField(child=IntegerField())
+
+
 class SignedScoreSerializer(Serializer):
     player = CharField()
     score = IntegerField()
@@ -0,0 +1,161 @@
+"""
+Point in time leaderboard snapshots. A snapshot stores a game's leaderboard ordering as
+three parallel integer arrays (user ids, scores and token ids). Each array is delta
+encoded into zigzag varints and zlib compressed, so a snapshot costs a few bytes per
+player instead of a copy of every high score row.
+
+Decoded snapshots are kept as packed int64 arrays in a per-process LRU cache bounded by
+`SNAPSHOT_CACHE_MAX_ROWS` entries in total, so large boards can't grow a worker without
+limit.
+"""
+
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from games.models import LeaderboardSnapshot, PlayerHighScore
+
+User = get_user_model()
+
+_lock = threading.Lock()
+_snapshots: OrderedDict[int, "SnapshotEntries"] = OrderedDict()
+
+
+def encode_deltas(values: list[int]) -> bytes:
+    """Encodes integers as compressed zigzag varint deltas"""
+    buffer = bytearray()
+    previous = 0
+    for value in values:
+        delta = value - previous
+        previous = value
+
+        # zigzag so small negative deltas stay small
+        n = delta * 2 if delta >= 0 else -delta * 2 - 1
+        while n > 0x7F:
+            buffer.append((n & 0x7F) | 0x80)
+            n >>= 7
+        buffer.append(n)
+
+    return zlib.compress(bytes(buffer))
+
+
+def decode_deltas(data: bytes) -> list[int]:
+    values = []
+    previous = 0
+    n = shift = 0
+    for byte in zlib.decompress(data):
+        n |= (byte & 0x7F) << shift
+        shift += 7
+        if byte & 0x80:
+            continue
+
+        previous += n // 2 if n % 2 == 0 else -(n + 1) // 2
+        values.append(previous)
+        n = shift = 0
+
+    return values
+
+
+@dataclass
+class SnapshotEntries:
+    """Decoded snapshot, entries are in leaderboard order so rank is index + 1"""
+
+    user_ids: array
+    scores: array
+    token_ids: array
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    def rank_of_user(self, user_id: int) -> int | None:
+        # a scan of the packed array, no per-user index is kept in memory
+        try:
+            return self.user_ids.index(user_id) + 1
+        except ValueError:
+            return None
+
+    def entry(self, rank: int) -> dict:
+        return {
+            "rank": rank,
+            "user_id": self.user_ids[rank - 1],
+            "score": self.scores[rank - 1],
+            "token_id": self.token_ids[rank - 1],
+        }
+
+
+class SnapshotRows:
+    """Lazy sequence of snapshot entries, slicing only looks up the users in the slice"""
+
+    def __init__(self, entries: SnapshotEntries):
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __getitem__(self, index: slice) -> list[dict]:
+        assert isinstance(index, slice) and index.step is None, "only slices supported"
+        start, stop, _ = index.indices(len(self))
+        rows = [self.entries.entry(rank) for rank in range(start + 1, stop + 1)]
+        users = User.objects.in_bulk([row["user_id"] for row in rows])
+        for row in rows:
+            user = users.get(row["user_id"])
+            row["username"] = user.username if user else None
+            row["eth_address"] = user.eth_address if user else None
+        return rows
+
+
+def take_snapshot(game_id: int, block_number: int | None = None) -> LeaderboardSnapshot:
+    """Captures the current leaderboard ordering of a game"""
+    user_ids, scores, token_ids = [], [], []
+    rows = (
+        PlayerHighScore.objects.filter(game_id=game_id)
+        .order_by("-score", "id")
+        .values_list("user_id", "score", "token_id")
+    )
+    for user_id, score, token_id in rows.iterator(chunk_size=2000):
+        user_ids.append(user_id)
+        scores.append(score)
+        token_ids.append(token_id)
+
+    return LeaderboardSnapshot.objects.create(
+        game_id=game_id,
+        block_number=block_number,
+        size=len(user_ids),
+        user_ids=encode_deltas(user_ids),
+        scores=encode_deltas(scores),
+        token_ids=encode_deltas(token_ids),
+    )
+
+
+def load_snapshot(snapshot_id: int) -> SnapshotEntries:
+    """Decodes a snapshot, snapshots never change so decoded ones are kept around"""
+    with _lock:
+        if (entries := _snapshots.get(snapshot_id)) is not None:
+            _snapshots.move_to_end(snapshot_id)
+            return entries
+
+    snapshot = LeaderboardSnapshot.objects.get(id=snapshot_id)
+    entries = SnapshotEntries(
+        user_ids=array("q", decode_deltas(snapshot.user_ids)),
+        scores=array("q", decode_deltas(snapshot.scores)),
+        token_ids=array("q", decode_deltas(snapshot.token_ids)),
+    )
+
+    # evict the least recently used snapshots until the rows fit
+    max_rows = settings.SNAPSHOT_CACHE_MAX_ROWS
+    if len(entries) <= max_rows:
+        with _lock:
+            _snapshots[snapshot_id] = entries
+            while sum(len(cached) for cached in _snapshots.values()) > max_rows:
+                _snapshots.popitem(last=False)
+    return entries
+
+
+def clear_snapshots():
+    with _lock:
+        _snapshots.clear()
@@ -1,27 +1,70 @@
-from hashlib import sha256
+import csv
+import gzip
+import json
+import re
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.http import Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.transaction import non_atomic_requests
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 from drf_spectacular.utils import OpenApiResponse, extend_schema
-from hexbytes import HexBytes
+from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.mixins import ListModelMixin, RetrieveModelMixin
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import GenericViewSet
 
-from games.helpers import sign_score
-from games.models import Game, PlayerHighScore, PlayerScore
+from api.pagination import CountlessPagination
+from games.events import astream, stream
+from games.helpers import sign_player_scores, sign_player_scores_on_commit
+from games.leaderboard import LeaderboardRows, get_leaderboard
+from games.models import (
+    Game,
+    LeaderboardSnapshot,
+    PlayerHighScore,
+    PlayerScore,
+    PlayerSummary,
+    PlayerSummaryVersion,
+)
+from games.nonces import consumed_scores
+from games.pagination import (
+    GlobalLeaderboardCursorPagination,
+    LeaderboardCursorPagination,
+    PlayerHighScoreCursorPagination,
+    PlayerScoreCursorPagination,
+)
 from games.serializers import (
     GameSerializer,
+    GlobalLeaderboardSerializer,
+    LeaderboardRankQuerySerializer,
+    LeaderboardRankSerializer,
     LeaderboardSerializer,
+    LeaderboardSnapshotQuerySerializer,
+    LeaderboardSnapshotSerializer,
     PlayerHighScoreSerializer,
     PlayerScoreSerializer,
+    ScoreBatchResultSerializer,
+    ScoreBatchSerializer,
+    ScoreDistributionQuerySerializer,
+    ScoreDistributionSerializer,
     ScoreIdSerializer,
     SignedScoreSerializer,
+    SnapshotEntrySerializer,
+    SnapshotRankQuerySerializer,
 )
+from games.snapshots import SnapshotRows, load_snapshot
+from utils.rest_framework.mixins import CursorModeMixin
+from utils.rest_framework.negotiation import IgnoreClientContentNegotiation
+from utils.rest_framework.permissions import IsGameServer
 from utils.rest_framework.serializers import MetadataSerializer
 
 User = get_user_model()
@@ -36,12 +79,104 @@ class GameViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
         return Game.objects.all()
 
 
-class LeaderboardViewSet(GenericViewSet, ListModelMixin):
+class LeaderboardViewSet(CursorModeMixin, GenericViewSet, ListModelMixin):
+    """
+    Leaderboard for a game, ordered by score with ties broken by id.
+    Pass `?cursor=` to page with keyset pagination instead of limit/offset.
+
+    Responses carry an ETag and Last-Modified for the board's current version, so polls
+    that send `If-None-Match`/`If-Modified-Since` get a 304 when nothing has changed.
+    """
+
     authentication_classes = []
     permission_classes = [AllowAny]
     serializer_class = LeaderboardSerializer
+    cursor_pagination_class = LeaderboardCursorPagination
     lookup_field = "game_id"
 
+    def list(self, request, *args, **kwargs):
+        try:
+            leaderboard = get_leaderboard(self.kwargs["game_id"])
+        except Game.DoesNotExist:
+            raise Http404("Game not found")
+
+        # short circuit unchanged boards before any rows are read
+        last_modified = (
+            int(leaderboard.last_modified.timestamp())
+            if leaderboard.last_modified
+            else None
+        )
+        response = get_conditional_response(
+            request, etag=leaderboard.etag, last_modified=last_modified
+        )
+        if response is None:
+            response = self._list(request, leaderboard, *args, **kwargs)
+
+        response["ETag"] = leaderboard.etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def _list(self, request, leaderboard, *args, **kwargs):
+        # keyset pages seek straight through the db
+        if self.is_cursor_mode:
+            return super().list(request, *args, **kwargs)
+
+        # the hot first page is served pre-rendered
+        if self._is_first_page(request):
+            return self._first_page(request, leaderboard)
+
+        # limit/offset pages are sliced out of the in-process leaderboard
+        page = self.paginate_queryset(LeaderboardRows(leaderboard))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def _is_first_page(self, request) -> bool:
+        return (
+            request.accepted_renderer.format == "json"
+            and self.paginator.get_offset(request) == 0
+            and self.paginator.get_limit(request) <= settings.LEADERBOARD_PRERENDER_SIZE
+        )
+
+    def _first_page(self, request, leaderboard) -> HttpResponse:
+        """
+        Serves the first page from the top ranks serialized once per change to them. Only the
+        envelope is rendered again (and gzipped) when the count moves as players join below.
+        """
+        rendered = leaderboard.rendered
+        if "results" not in rendered:
+            rows = LeaderboardRows(leaderboard)[: settings.LEADERBOARD_PRERENDER_SIZE]
+            rendered["results"] = self.get_serializer(rows, many=True).data
+
+        # work out the envelope the paginator would give this page
+        paginator = self.paginator
+        paginator.request = request
+        paginator.limit = paginator.get_limit(request)
+        paginator.offset = 0
+        paginator.count = len(leaderboard)
+        key = (paginator.limit, paginator.count, paginator.get_next_link())
+
+        body = rendered.get(paginator.limit)
+        if body is None or body[0] != key:
+            content = JSONRenderer().render(
+                {
+                    "count": paginator.count,
+                    "next": key[2],
+                    "previous": None,
+                    "results": rendered["results"][: paginator.limit],
+                }
+            )
+            body = (key, content, gzip.compress(content, mtime=0))
+            rendered[paginator.limit] = body
+
+        if re.search(r"\bgzip\b", request.META.get("HTTP_ACCEPT_ENCODING", "")):
+            response = HttpResponse(body[2], content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(body[1], content_type="application/json")
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return response
+
     def get_queryset(self):
         game_id = self.kwargs.get("game_id")
         assert game_id, "game_id is required"
@@ -51,36 +186,413 @@ class LeaderboardViewSet(GenericViewSet, ListModelMixin):
         return (
             PlayerHighScore.objects.filter(game_id=game_id)
             .select_related("user")
-            .order_by("-score")
+            .order_by("-score", "id")
             .all()
         )
 
 
-class PlayerHighScoreViewSet(GenericViewSet, ListModelMixin, RetrieveModelMixin):
+@method_decorator(non_atomic_requests, name="dispatch")
+class LeaderboardExportView(APIView):
+    """
+    Streams a whole game leaderboard as CSV or NDJSON. Rows are read through a server side
+    cursor and written out as they arrive, so memory stays flat no matter the board size.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    # the format comes from the path, so csv and ndjson `Accept` headers aren't refused
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    # leaderboard fields to the values they are read from
+    columns = {
+        field: {
+            "username": "user__username",
+            "eth_address": "user__eth_address",
+        }.get(field, field)
+        for field in LeaderboardSerializer.Meta.fields
+    }
+    content_types = {
+        "csv": "text/csv",
+        "ndjson": "application/x-ndjson",
+    }
+
+    @extend_schema(responses={200: OpenApiResponse(description="Leaderboard file")})
+    def get(self, request, game_id: int, export_format: str):
+        if not Game.objects.filter(id=game_id).exists():
+            raise Http404("Game not found")
+
+        rows = (
+            PlayerHighScore.objects.filter(game_id=game_id)
+            .order_by("-score", "id")
+            .values_list(*self.columns.values())
+            .iterator(chunk_size=settings.LEADERBOARD_EXPORT_CHUNK_SIZE)
+        )
+        lines = (
+            self.csv_lines(rows) if export_format == "csv" else self.ndjson_lines(rows)
+        )
+
+        response = StreamingHttpResponse(
+            lines, content_type=self.content_types[export_format]
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="leaderboard-{game_id}.{export_format}"'
+        )
+        return response
+
+    def csv_lines(self, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(self.columns.keys())
+        for row in rows:
+            yield writer.writerow(row)
+
+    def ndjson_lines(self, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(self.columns, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+@method_decorator(non_atomic_requests, name="dispatch")
+class LeaderboardEventsView(APIView):
+    """
+    Streams a game's leaderboard changes as server-sent events. Each `score` event carries
+    the player's new score and rank along with the previous ones, and a keepalive comment
+    is sent while the board is idle.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    # `EventSource` asks for `text/event-stream`, which no renderer would accept
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    @extend_schema(responses={200: OpenApiResponse(description="Event stream")})
+    def get(self, request, game_id: int):
+        # load the board up front so the first change already has a previous rank
+        try:
+            get_leaderboard(game_id)
+        except Game.DoesNotExist:
+            raise Http404("Game not found")
+
+        # streams can stay open for hours and never touch the db again
+        connection.close()
+
+        # async streams wait on the event loop instead of holding a thread
+        if isinstance(request._request, ASGIRequest):
+            events = astream(game_id)
+        else:
+            events = stream(game_id)
+
+        response = StreamingHttpResponse(events, content_type="text/event-stream")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+
+class _Echo:
+    """File-like object that hands back what's written, so csv rows can be streamed"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+class GlobalLeaderboardViewSet(CursorModeMixin, GenericViewSet, ListModelMixin):
+    """
+    Leaderboard across every game, ordered by total score with ties broken by id.
+    Pass `?cursor=` to page with keyset pagination instead of limit/offset.
+
+    Responses carry an ETag and Last-Modified for the board's current version, so polls
+    that send `If-None-Match`/`If-Modified-Since` get a 304 when nothing has changed.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = GlobalLeaderboardSerializer
+    cursor_pagination_class = GlobalLeaderboardCursorPagination
+
+    def list(self, request, *args, **kwargs):
+        # every write to the summaries bumps their version, so polls never read them
+        version, updated_at = PlayerSummaryVersion.current()
+        etag = f'W/"global-{version}"'
+        last_modified = int(updated_at.timestamp()) if updated_at else None
+
+        # short circuit unchanged boards before any rows are read
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def get_queryset(self):
+        return (
+            PlayerSummary.objects.select_related("user")
+            .order_by("-total_score", "id")
+            .all()
+        )
+
+
+class LeaderboardRankView(APIView):
+    @extend_schema(
+        parameters=[LeaderboardRankQuerySerializer],
+        responses={200: LeaderboardRankSerializer},
+    )
+    def get(self, request, game_id: int):
+        """Endpoint to get the player's rank on a game leaderboard, along with the `n` entries above and below them"""
+
+        # serialize query params
+        serializer = LeaderboardRankQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        n = serializer.validated_data["n"]
+
+        # get the player's high score
+        try:
+            phs = PlayerHighScore.objects.get(game_id=game_id, user=request.user)
+        except PlayerHighScore.DoesNotExist:
+            raise Http404()
+
+        # read the window around the player straight off the rank column
+        entries = (
+            PlayerHighScore.objects.filter(
+                game_id=game_id,
+                rank__gte=phs.rank - n,
+                rank__lte=phs.rank + n,
+            )
+            .select_related("user")
+            .order_by("rank")
+        )
+
+        return Response(
+            data=LeaderboardRankSerializer({"rank": phs.rank, "results": entries}).data
+        )
+
+
+class ScoreDistributionView(APIView):
+    @extend_schema(
+        parameters=[ScoreDistributionQuerySerializer],
+        responses={200: ScoreDistributionSerializer},
+    )
+    def get(self, request, game_id: int):
+        """
+        Endpoint to get the score distribution of a game leaderboard (histogram and p50/p90/p99),
+        along with the player's percentile. `percentile` is the share of players with a lower
+        score and `top_percent` is the player's rank as a share of the board.
+        """
+
+        # serialize query params
+        serializer = ScoreDistributionQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        buckets = serializer.validated_data["buckets"]
+
+        # served from the in-process leaderboard, no rows are scanned
+        try:
+            leaderboard = get_leaderboard(game_id)
+        except Game.DoesNotExist:
+            raise Http404("Game not found")
+        distribution = leaderboard.distribution
+
+        data = {
+            "count": len(distribution),
+            "p50": distribution.percentile(50),
+            "p90": distribution.percentile(90),
+            "p99": distribution.percentile(99),
+            "histogram": distribution.histogram(buckets),
+            "rank": None,
+            "score": None,
+            "percentile": None,
+            "top_percent": None,
+        }
+
+        # place the player on the distribution
+        if entry := leaderboard.entry_for_user(request.user.id):
+            rank = leaderboard.rank(entry)
+            data["rank"] = rank
+            data["score"] = entry.score
+            data["percentile"] = distribution.percentile_of(entry.score)
+            data["top_percent"] = rank / len(distribution) * 100
+
+        return Response(data=ScoreDistributionSerializer(data).data)
+
+
+class LeaderboardSnapshotViewSet(GenericViewSet, ListModelMixin):
+    """
+    Snapshots of a game leaderboard, newest first. Filter with `block` or `timestamp`
+    to get the leaderboard as of a block number or point in time.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = LeaderboardSnapshotSerializer
+
+    @extend_schema(parameters=[LeaderboardSnapshotQuerySerializer])
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        serializer = LeaderboardSnapshotQuerySerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        queryset = LeaderboardSnapshot.objects.filter(
+            game_id=self.kwargs["game_id"]
+        ).defer("user_ids", "scores", "token_ids")
+        if (block := serializer.validated_data.get("block")) is not None:
+            return queryset.filter(block_number__lte=block).order_by(
+                "-block_number", "-id"
+            )
+        if timestamp := serializer.validated_data.get("timestamp"):
+            queryset = queryset.filter(created_at__lte=timestamp)
+        return queryset.order_by("-created_at", "-id")
+
+
+class LeaderboardSnapshotEntryViewSet(GenericViewSet):
+    """Entries of a leaderboard snapshot, in leaderboard order"""
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = SnapshotEntrySerializer
+
+    def get_entries(self):
+        try:
+            return load_snapshot(self.kwargs["snapshot_id"])
+        except LeaderboardSnapshot.DoesNotExist:
+            raise Http404("Snapshot not found")
+
+    def list(self, request, snapshot_id: int):
+        page = self.paginate_queryset(SnapshotRows(self.get_entries()))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @extend_schema(
+        parameters=[SnapshotRankQuerySerializer],
+        responses={200: SnapshotEntrySerializer},
+    )
+    def rank(self, request, snapshot_id: int):
+        """Endpoint to get a player's rank in a leaderboard snapshot"""
+        serializer = SnapshotRankQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        entries = self.get_entries()
+
+        try:
+            user = User.objects.get(
+                eth_address=serializer.validated_data["eth_address"].lower()
+            )
+        except User.DoesNotExist:
+            raise Http404()
+
+        rank = entries.rank_of_user(user.id)
+        if rank is None:
+            raise Http404()
+
+        entry = entries.entry(rank) | {
+            "username": user.username,
+            "eth_address": user.eth_address,
+        }
+        return Response(data=self.get_serializer(entry).data)
+
+
+class PlayerHighScoreViewSet(
+    CursorModeMixin, GenericViewSet, ListModelMixin, RetrieveModelMixin
+):
+    """
+    The player's high scores, ordered by game.
+    Pass `?cursor=` to page with keyset pagination instead of limit/offset.
+    """
+
     serializer_class = PlayerHighScoreSerializer
+    pagination_class = CountlessPagination
+    cursor_pagination_class = PlayerHighScoreCursorPagination
     lookup_field = "game_id"
 
     def get_queryset(self):
         return (
             PlayerHighScore.objects.filter(user=self.request.user)
             .select_related("game")
-            .order_by("game_id")
+            .order_by("game_id", "id")
             .all()
         )
 
 
-class PlayerScoreViewSet(GenericViewSet, ListModelMixin):
+class PlayerScoreViewSet(CursorModeMixin, GenericViewSet, ListModelMixin):
+    """
+    The player's scores, ordered by game and then by when they were submitted.
+    Pass `?cursor=` to page with keyset pagination instead of limit/offset.
+    """
+
     serializer_class = PlayerScoreSerializer
+    pagination_class = CountlessPagination
+    cursor_pagination_class = PlayerScoreCursorPagination
 
     def get_queryset(self):
         return (
             PlayerScore.objects.filter(user=self.request.user)
             .select_related("game")
-            .order_by("game_id")
+            .order_by("game_id", "created_at", "id")
             .all()
         )
 
 
+class BatchScoresView(APIView):
+    """
+    Endpoint for game servers to report scores in bulk. Restricted to the game server group,
+    players and games are resolved with one lookup each and the scores are inserted in chunks.
+    """
+
+    permission_classes = [IsGameServer]
+
+    @extend_schema(
+        request=ScoreBatchSerializer,
+        responses={201: ScoreBatchResultSerializer},
+    )
+    def post(self, request):
+        # serialize data
+        serializer = ScoreBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        scores = serializer.validated_data["scores"]
+
+        # resolve every player and game in the batch at once
+        players = {score["player"].lower() for score in scores}
+        games = {score["game"].lower() for score in scores}
+        user_ids = dict(
+            User.objects.filter(eth_address__in=players).values_list(
+                "eth_address", "id"
+            )
+        )
+        game_ids = dict(
+            Game.objects.filter(eth_address__in=games).values_list("eth_address", "id")
+        )
+        if unknown := sorted(players - user_ids.keys()):
+            raise ValidationError(
+                detail={"players": [f"Unknown players: {', '.join(unknown)}"]},
+                code="unknown_players",
+            )
+        if unknown := sorted(games - game_ids.keys()):
+            raise ValidationError(
+                detail={"games": [f"Unknown games: {', '.join(unknown)}"]},
+                code="unknown_games",
+            )
+
+        # insert in chunks and sign them once committed, like gameplay scores
+        created = PlayerScore.objects.bulk_create(
+            [
+                PlayerScore(
+                    user_id=user_ids[score["player"].lower()],
+                    game_id=game_ids[score["game"].lower()],
+                    score=score["score"],
+                )
+                for score in scores
+            ],
+            batch_size=settings.SCORE_BATCH_CHUNK_SIZE,
+        )
+        ids = [score.id for score in created]
+        sign_player_scores_on_commit(ids)
+
+        return Response(
+            data=ScoreBatchResultSerializer({"ids": ids}).data,
+            status=status.HTTP_201_CREATED,
+        )
+
+
 class SignScoresView(APIView):
     @extend_schema(
         request=ScoreIdSerializer,
@@ -96,34 +608,34 @@ class SignScoresView(APIView):
         # get scores
         scores = PlayerScore.objects.filter(
             user=request.user, id__in=serializer.validated_data["ids"]
-        )
+        ).select_related("game", "user")
         if len(scores) != len(serializer.validated_data["ids"]):
             raise ValidationError(
                 detail="All scores do not belong to the logged in user",
                 code="invalid_scores",
             )
 
-        # sign each score
-        score_data = []
-        for score in scores:
-            nonce = f"0x{sha256(HexBytes(score.id)).hexdigest()}"
-            score_data.append(
-                {
-                    "player": request.user.eth_address,
-                    "score": score.score,
-                    "nonce": nonce,
-                    "signature": sign_score(
-                        score.game.name,
-                        score.game.eth_address,
-                        score.game.signing_key,
-                        request.user.eth_address,
-                        score.score,
-                        nonce,
-                    ),
-                    "game_address": score.game.eth_address,
-                }
+        # scores can only be used onchain once
+        if consumed_scores(scores):
+            raise ValidationError(
+                detail="Some scores have already been used onchain",
+                code="consumed_scores",
             )
 
+        # scores are signed once committed, older ones are signed here on first request
+        sign_player_scores(scores)
+
+        score_data = [
+            {
+                "player": request.user.eth_address,
+                "score": score.score,
+                "nonce": score.nonce,
+                "signature": score.signature,
+                "game_address": score.game.eth_address,
+            }
+            for score in scores
+        ]
+
         # return data
         ret_serializer = SignedScoreSerializer(data=score_data, many=True)
         ret_serializer.is_valid()
@@ -131,7 +643,7 @@ class SignScoresView(APIView):
 
 
 class DeleteScoresView(APIView):
-    """Endpoint to delete scores. Since scores can't be reused onchain, we don't have to rely on this to be executed for security reasons, but it's much easier than trying to index all scores used and delete from the db automatically."""
+    """Endpoint to delete scores. Scores used onchain are also deleted automatically by the score consumed webhook, so this is just a shortcut for clients that already know a score was used."""
 
     @extend_schema(
         request=ScoreIdSerializer,
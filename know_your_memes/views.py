@@ -9,7 +9,9 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.viewsets import ViewSet
 
-from games.models import Game, PlayerHighScore, PlayerScore
+from games.helpers import sign_player_scores_on_commit
+from games.leaderboard import get_leaderboard
+from games.models import Game, PlayerScore
 from know_your_memes.models import Gameplay, Question
 from know_your_memes.questions import ARTISTS, QUESTIONS, SEASONS, SUPPLIES, TITLES
 from know_your_memes.serializers import (
@@ -141,7 +143,10 @@ class GameplayViewset(ViewSet):
 
         # create score entry
         game = Game.objects.get(eth_address__iexact=settings.KYM_GAME_ADDRESS)
-        PlayerScore.objects.create(game=game, user=user, score=gameplay.total_score)
+        score = PlayerScore.objects.create(
+            game=game, user=user, score=gameplay.total_score
+        )
+        sign_player_scores_on_commit([score.id])
 
         # return success
         return Response(data=GameplayResultsSerializer(gameplay).data)
@@ -198,34 +203,33 @@ class KYMTrophyMetadataView(APIView):
             "attributes": [],
         }
 
-        # get high score for this token id
+        # get the game's leaderboard
         try:
-            phs = PlayerHighScore.objects.get(
-                game__eth_address__iexact=settings.KYM_GAME_ADDRESS,
-                token_id=token_id,
+            game = Game.objects.only("id").get(
+                eth_address=settings.KYM_GAME_ADDRESS.lower()
             )
-            metadata["attributes"].append(
-                {
-                    "trait_type": "Score",
-                    "value": phs.score,
-                }
-            )
-        except PlayerHighScore.DoesNotExist:
+            leaderboard = get_leaderboard(game.id)
+        except Game.DoesNotExist:
             raise Http404()
 
-        # get the top three high scores
-        top_three = PlayerHighScore.objects.filter(
-            game__eth_address__iexact=settings.KYM_GAME_ADDRESS
-        ).order_by("-score")[:3]
-
-        top_three_ids = [phs.token_id for phs in top_three]
+        # get high score for this token id
+        entry = leaderboard.entry_for_token(token_id)
+        if entry is None:
+            raise Http404()
+        metadata["attributes"].append(
+            {
+                "trait_type": "Score",
+                "value": entry.score,
+            }
+        )
 
-        # if the token is the first token, change image url
-        if top_three_ids[0] == token_id:
+        # if the token is in the top three, change image url
+        rank = leaderboard.rank(entry)
+        if rank == 1:
             metadata["image"] = settings.KYM_NFT_1ST_IMAGE_URL
-        elif top_three_ids[1] == token_id:
+        elif rank == 2:
             metadata["image"] = settings.KYM_NFT_2ND_IMAGE_URL
-        elif top_three_ids[2] == token_id:
+        elif rank == 3:
             metadata["image"] = settings.KYM_NFT_3RD_IMAGE_URL
 
         serializer = MetadataSerializer(data=metadata)
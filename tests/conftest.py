@@ -1,5 +1,6 @@
 import pytest
 from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from eth_account import Account
 from eth_account.messages import encode_defunct
@@ -7,11 +8,26 @@ from rest_framework import status
 from rest_framework.test import APIClient
 from siwe import SiweMessage
 
+from games.leaderboard import clear_leaderboards
+from games.nonces import clear_nonce_filters
+from games.snapshots import clear_snapshots
+from webhooks.registry import clear_webhook_registry
+
 
 class AuthClient(APIClient):
     eth_address: str
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    # in-process caches outlive the db between tests, which reuses ids
+    clear_leaderboards()
+    clear_snapshots()
+    clear_nonce_filters()
+    clear_webhook_registry()
+    cache.clear()
+
+
 @pytest.fixture()
 def api_client():
     return APIClient(enforce_csrf_checks=True)
@@ -1,7 +1,7 @@
 from secrets import token_hex
 
 from django.contrib.auth import get_user_model
-from factory import LazyAttribute, SubFactory
+from factory import LazyAttribute, Sequence, SubFactory
 from factory.django import DjangoModelFactory
 from factory.faker import Faker
 
@@ -14,7 +14,7 @@ class UserFactory(DjangoModelFactory):
     class Meta:
         model = User
 
-    username = Faker("user_name")
+    username = Sequence(lambda n: f"player_{n}")
     eth_address = LazyAttribute(lambda _: f"0x{token_hex(20)}")
 
 
@@ -0,0 +1,139 @@
+import asyncio
+import json
+import threading
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+
+from games.events import (
+    LeaderboardEvent,
+    Subscription,
+    astream,
+    has_subscribers,
+    publish,
+    stream,
+)
+from games.leaderboard import get_leaderboard, record_high_score
+from tests.factories import GameFactory, PlayerHighScoreFactory
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+def _event(line: bytes) -> dict:
+    event, data = line.decode().strip().split("\n")
+    assert event == "event: score"
+    return json.loads(data.removeprefix("data: "))
+
+
+def test_stream_leaderboard_events(api_client, settings, monkeypatch):
+    settings.LEADERBOARD_EVENTS_KEEPALIVE = timedelta(milliseconds=10)
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+
+    # the db connection is handed back before streaming starts
+    closed = []
+    monkeypatch.setattr(connection, "close", lambda: closed.append(True))
+    response = api_client.get(
+        f"/leaderboard/{game.id}/events", HTTP_ACCEPT="text/event-stream"
+    )
+    monkeypatch.undo()
+    lines = iter(response.streaming_content)
+    assert (
+        response.status_code == 200
+        and response["Content-Type"] == "text/event-stream"
+        and next(lines) == b"retry: 3000\n\n"
+        and closed
+    )
+
+    # raise the last place score to the top
+    phs = sorted_high_scores[-1]
+    previous_score = phs.score
+    phs.score = sorted_high_scores[0].score + 1
+    phs.save()
+    record_high_score(phs)
+
+    assert _event(next(lines)) == {
+        "id": phs.id,
+        "user_id": phs.user_id,
+        "token_id": phs.token_id,
+        "score": phs.score,
+        "rank": 1,
+        "previous_score": previous_score,
+        "previous_rank": 10,
+    }
+
+    # idle streams are kept alive
+    assert next(lines) == b": keepalive\n\n"
+
+    # closing the stream unsubscribes it
+    response.close()
+    assert not has_subscribers(game.id)
+
+
+def test_stream_leaderboard_events_fan_out(settings):
+    settings.LEADERBOARD_EVENTS_KEEPALIVE = timedelta(seconds=5)
+    game = GameFactory()
+    phs = PlayerHighScoreFactory(game=game)
+    get_leaderboard(game.id)
+    phs.score += 1
+    phs.save()
+
+    async def listen(ready: asyncio.Event) -> dict:
+        events = astream(game.id)
+        assert await anext(events) == "retry: 3000\n\n"
+        ready.set()
+        event = await anext(events)
+        await events.aclose()
+        return _event(event.encode())
+
+    async def main():
+        ready = [asyncio.Event(), asyncio.Event()]
+        listeners = [asyncio.create_task(listen(event)) for event in ready]
+        await asyncio.gather(*(event.wait() for event in ready))
+
+        # publish from a worker thread like a committed webhook would
+        publisher = threading.Thread(target=record_high_score, args=(phs,))
+        publisher.start()
+        await asyncio.to_thread(publisher.join)
+        return await asyncio.gather(*listeners)
+
+    events = asyncio.run(main())
+    assert [event["score"] for event in events] == [
+        phs.score,
+        phs.score,
+    ] and not has_subscribers(game.id)
+
+
+def test_subscription():
+    event = LeaderboardEvent(1, 2, 3, 4, 1, None, None)
+    with Subscription(420) as first, Subscription(420) as second:
+        assert has_subscribers(420)
+        publish(420, event)
+        assert first.queue.get_nowait() == event and second.queue.get_nowait() == event
+    assert not has_subscribers(420)
+
+
+def test_subscription_overflow(settings):
+    settings.LEADERBOARD_EVENTS_KEEPALIVE = timedelta(milliseconds=10)
+    settings.LEADERBOARD_EVENTS_QUEUE_SIZE = 2
+    events = [LeaderboardEvent(i, 2, 3, 4, 1, None, None) for i in range(3)]
+
+    # a stream that falls behind is cut off once its inbox is full, the client
+    # reconnects and reloads the board rather than missing changes
+    lines = stream(420)
+    assert next(lines) == "retry: 3000\n\n"
+    for event in events:
+        publish(420, event)
+    assert list(lines) == [] and not has_subscribers(420)
+
+
+def test_stream_leaderboard_events_404(api_client):
+    response = api_client.get("/leaderboard/420/events")
+    assert response.status_code == 404
+
+    response = api_client.get(
+        "/leaderboard/420/events", HTTP_ACCEPT="text/event-stream"
+    )
+    assert response.status_code == 404 and response.json()["errors"]
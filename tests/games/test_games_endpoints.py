@@ -1,12 +1,28 @@
+import csv
+import gzip
+import json
+import math
+import random
+from base64 import urlsafe_b64encode
 from hashlib import sha256
 
 import pytest
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from hexbytes import HexBytes
 
-from games.models import PlayerScore
-from tests.factories import GameFactory, PlayerHighScoreFactory, PlayerScoreFactory
+from games.helpers import score_nonce, sign_score
+from games.leaderboard import record_high_score
+from games.models import ConsumedNonce, PlayerScore, PlayerSummary
+from tests.factories import (
+    GameFactory,
+    PlayerHighScoreFactory,
+    PlayerScoreFactory,
+    UserFactory,
+)
 
 pytestmark = [pytest.mark.django_db(transaction=True)]
 
@@ -59,21 +75,340 @@ def test_get_leaderboard(num, api_client):
 
     assert (
         response.status_code == 200
-        and response.data["count"] == num
+        and response.json()["count"] == num
         and all(
             [
-                data["username"] == high_score.user.username
+                data["rank"] == rank
+                and data["username"] == high_score.user.username
                 and data["eth_address"] == high_score.user.eth_address
                 and data["score"] == high_score.score
                 and data["token_id"] == high_score.token_id
-                for data, high_score in zip(
-                    response.data["results"], sorted_high_scores
+                for rank, (data, high_score) in enumerate(
+                    zip(response.json()["results"], sorted_high_scores), start=1
                 )
             ]
         )
     )
 
 
+def test_get_leaderboard_prerendered(api_client, settings):
+    settings.LEADERBOARD_PRERENDER_SIZE = 5
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(20, game=game)
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+
+    def get(**extra):
+        with CaptureQueriesContext(connection) as context:
+            response = api_client.get(f"/leaderboard/{game.id}?limit=5", **extra)
+        return response, [
+            q for q in context.captured_queries if "games_playerhighscore" in q["sql"]
+        ]
+
+    # the first request renders the page, later ones are served as bytes
+    response, queries = get()
+    assert response.status_code == 200 and queries
+    body = response.content
+    response, queries = get()
+    assert response.content == body and not queries
+
+    # compressed for clients that accept it
+    response, queries = get(HTTP_ACCEPT_ENCODING="gzip, deflate")
+    assert (
+        response["Content-Encoding"] == "gzip"
+        and gzip.decompress(response.content) == body
+        and not queries
+    )
+
+    # a player joining below the top ranks only moves the count
+    phs = PlayerHighScoreFactory(game=game, score=sorted_high_scores[-1].score - 1)
+    record_high_score(phs)
+    response, queries = get()
+    assert (
+        response.json()["count"] == 21
+        and response.json()["results"] == json.loads(body)["results"]
+        and not queries
+    )
+
+    # a change reaching the top ranks renders it again
+    phs.score = sorted_high_scores[0].score + 1
+    phs.save()
+    record_high_score(phs)
+    response, queries = get()
+    assert (
+        queries
+        and response.json()["results"][0]["token_id"] == phs.token_id
+        and response.json()["results"][0]["rank"] == 1
+    )
+
+    # other pages still go through the paginator
+    response = api_client.get(f"/leaderboard/{game.id}?limit=5&offset=5")
+    assert [data["rank"] for data in response.data["results"]] == [6, 7, 8, 9, 10]
+
+
+@pytest.mark.parametrize("query", ["", "?cursor="])
+def test_get_leaderboard_conditional(query, api_client):
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+
+    response = api_client.get(f"/leaderboard/{game.id}{query}")
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+    assert response.status_code == 200 and etag and last_modified
+
+    # unchanged boards are a 304 without reading any rows
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(
+            f"/leaderboard/{game.id}{query}", HTTP_IF_NONE_MATCH=etag
+        )
+    assert (
+        response.status_code == 304
+        and response["ETag"] == etag
+        and not [
+            q for q in context.captured_queries if "games_playerhighscore" in q["sql"]
+        ]
+    )
+    response = api_client.get(
+        f"/leaderboard/{game.id}{query}", HTTP_IF_MODIFIED_SINCE=last_modified
+    )
+    assert response.status_code == 304
+
+    # a raised score changes the version
+    phs = high_scores[0]
+    phs.score += 1
+    phs.save()
+    record_high_score(phs)
+
+    response = api_client.get(f"/leaderboard/{game.id}{query}", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response["ETag"] != etag
+
+
+@pytest.mark.parametrize(["num", "limit"], [(1, 10), (10, 3), (25, 7)])
+def test_get_leaderboard_cursor(num, limit, api_client):
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(num, game=game)
+
+    # add ties to make sure they are paged deterministically
+    high_scores += PlayerHighScoreFactory.create_batch(
+        num, game=game, score=high_scores[0].score
+    )
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+
+    # walk the whole board forwards
+    results = []
+    pages = []
+    url = f"/leaderboard/{game.id}?cursor=&limit={limit}"
+    while url:
+        response = api_client.get(url)
+        assert response.status_code == 200 and "count" not in response.data
+        results += response.data["results"]
+        pages.append(response.data)
+        url = response.data["next"]
+
+    assert pages[0]["previous"] is None and [
+        (data["username"], data["score"]) for data in results
+    ] == [
+        (high_score.user.username, high_score.score)
+        for high_score in sorted_high_scores
+    ]
+
+    # walk back from the last page
+    if len(pages) > 1:
+        response = api_client.get(pages[-1]["previous"])
+        assert response.data["results"] == pages[-2]["results"]
+
+
+def test_get_leaderboard_cursor_is_flat(api_client):
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(50, game=game)
+
+    # every page is a single seek, with no count and no offset
+    response = api_client.get(f"/leaderboard/{game.id}?cursor=&limit=10")
+    for _ in range(3):
+        with CaptureQueriesContext(connection) as ctx:
+            response = api_client.get(response.data["next"])
+
+        queries = [
+            query["sql"]
+            for query in ctx.captured_queries
+            if "games_playerhighscore" in query["sql"]
+        ]
+        assert (
+            len(queries) == 1
+            and "COUNT" not in queries[0]
+            and "OFFSET" not in queries[0]
+        )
+
+
+@pytest.mark.parametrize(
+    "position",
+    [[{"a": 1}, 1], ["abc", "x"], [[1], 1], [None, 1], [1], "p"],
+)
+def test_get_leaderboard_invalid_cursor(position, api_client):
+    game = GameFactory()
+    response = api_client.get(f"/leaderboard/{game.id}?cursor=foo")
+    assert response.status_code == 404
+
+    # well formed cursors with values that don't fit the ordering
+    token = urlsafe_b64encode(json.dumps({"p": position}).encode()).decode()
+    for path in [f"/leaderboard/{game.id}", "/leaderboard/global"]:
+        response = api_client.get(f"{path}?cursor={token.rstrip('=')}")
+        assert response.status_code == 404
+
+
+@pytest.mark.parametrize("num", [1, 10, 50])
+def test_get_global_leaderboard(num, api_client):
+    games = GameFactory.create_batch(3)
+    users = UserFactory.create_batch(num)
+    totals = {}
+    for user in users:
+        for game in random.sample(games, k=random.randint(1, 3)):
+            phs = PlayerHighScoreFactory(user=user, game=game)
+            totals[user.username] = totals.get(user.username, 0) + phs.score
+    sorted_users = sorted(users, key=lambda x: (-totals[x.username], x.id))
+
+    response = api_client.get("/leaderboard/global")
+
+    assert (
+        response.status_code == 200
+        and response.data["count"] == num
+        and [
+            (data["username"], data["total_score"]) for data in response.data["results"]
+        ]
+        == [(user.username, totals[user.username]) for user in sorted_users][:24]
+    )
+
+    # walk the same board with a cursor
+    results = []
+    url = "/leaderboard/global?cursor=&limit=7"
+    while url:
+        response = api_client.get(url)
+        results += response.data["results"]
+        url = response.data["next"]
+
+    assert [data["username"] for data in results] == [
+        user.username for user in sorted_users
+    ]
+
+
+@pytest.mark.parametrize("query", ["", "?cursor="])
+def test_get_global_leaderboard_conditional(query, api_client):
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+
+    response = api_client.get(f"/leaderboard/global{query}")
+    etag, last_modified = response["ETag"], response["Last-Modified"]
+    assert response.status_code == 200 and etag and last_modified
+
+    # unchanged boards are a 304 without reading any rows
+    with CaptureQueriesContext(connection) as context:
+        response = api_client.get(
+            f"/leaderboard/global{query}", HTTP_IF_NONE_MATCH=etag
+        )
+    assert (
+        response.status_code == 304
+        and response["ETag"] == etag
+        and not [
+            q for q in context.captured_queries if '"games_playersummary"' in q["sql"]
+        ]
+    )
+    response = api_client.get(
+        f"/leaderboard/global{query}", HTTP_IF_MODIFIED_SINCE=last_modified
+    )
+    assert response.status_code == 304
+
+    # a raised score changes the version
+    phs = high_scores[0]
+    phs.score += 1
+    phs.save()
+
+    response = api_client.get(f"/leaderboard/global{query}", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response["ETag"] != etag
+
+    # and so does a rebuild
+    etag = response["ETag"]
+    PlayerSummary.rebuild()
+    response = api_client.get(f"/leaderboard/global{query}", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200 and response["ETag"] != etag
+
+
+@pytest.mark.parametrize(["num", "n"], [(1, 5), (10, 3), (50, 5)])
+def test_get_leaderboard_rank(num, n, auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(num, game=game)
+    high_scores.append(
+        PlayerHighScoreFactory(user=user, game=game, score=high_scores[0].score)
+    )
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+    index = next(i for i, phs in enumerate(sorted_high_scores) if phs.user == user)
+    window = sorted_high_scores[max(index - n, 0) : index + n + 1]
+
+    response = auth_client.get(f"/leaderboard/{game.id}/me?n={n}")
+
+    assert (
+        response.status_code == 200
+        and response.data["rank"] == index + 1
+        and [
+            (data["rank"], data["username"], data["score"])
+            for data in response.data["results"]
+        ]
+        == [
+            (sorted_high_scores.index(phs) + 1, phs.user.username, phs.score)
+            for phs in window
+        ]
+    )
+
+
+def test_get_leaderboard_rank_404(auth_client):
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(3, game=game)
+
+    response = auth_client.get(f"/leaderboard/{game.id}/me")
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize("num", [0, 10, 100])
+def test_get_score_distribution(num, auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(num, game=game)
+    phs = PlayerHighScoreFactory(user=user, game=game)
+    high_scores.append(phs)
+    PlayerHighScoreFactory.create_batch(5)
+    scores = sorted(x.score for x in high_scores)
+    rank = sorted(high_scores, key=lambda x: (-x.score, x.id)).index(phs) + 1
+
+    response = auth_client.get(f"/leaderboard/{game.id}/distribution?buckets=5")
+
+    assert (
+        response.status_code == 200
+        and response.data["count"] == num + 1
+        and response.data["p50"] == scores[math.ceil(0.5 * (num + 1)) - 1]
+        and response.data["p99"] == scores[math.ceil(0.99 * (num + 1)) - 1]
+        and sum(bucket["count"] for bucket in response.data["histogram"]) == num + 1
+        and response.data["rank"] == rank
+        and response.data["score"] == phs.score
+        and response.data["percentile"]
+        == len([s for s in scores if s < phs.score]) / (num + 1) * 100
+        and response.data["top_percent"] == rank / (num + 1) * 100
+    )
+
+
+def test_get_score_distribution_without_high_score(auth_client):
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(3, game=game)
+
+    response = auth_client.get(f"/leaderboard/{game.id}/distribution")
+    assert (
+        response.status_code == 200
+        and response.data["count"] == 3
+        and response.data["rank"] is None
+        and response.data["percentile"] is None
+    )
+
+    response = auth_client.get("/leaderboard/420/distribution")
+    assert response.status_code == 404
+
+
 @pytest.mark.parametrize("num", [1, 10, 100])
 def test_get_player_high_scores(num, auth_client):
     user = User.objects.get(eth_address__iexact=auth_client.eth_address)
@@ -136,6 +471,80 @@ def test_get_player_scores(num: int, auth_client):
     )
 
 
+def test_get_player_scores_countless(auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    PlayerScoreFactory.create_batch(10, user=user)
+
+    # pages end when there is no extra row, not when the count runs out
+    response = auth_client.get("/scores?limit=4&offset=4")
+    assert (
+        response.status_code == 200
+        and response.data["has_next"]
+        and "offset=8" in response.data["next"]
+        and len(response.data["results"]) == 4
+    )
+    response = auth_client.get(response.data["next"])
+    assert (
+        not response.data["has_next"]
+        and response.data["next"] is None
+        and len(response.data["results"]) == 2
+    )
+
+    # the count is cached, so later pages don't count again
+    PlayerScoreFactory(user=user)
+    with CaptureQueriesContext(connection) as context:
+        response = auth_client.get("/scores?limit=4&offset=8")
+    assert (
+        response.data["count"] == 10
+        and len(response.data["results"]) == 3
+        and not [q for q in context.captured_queries if "COUNT(" in q["sql"]]
+    )
+
+
+@pytest.mark.parametrize(["num", "limit"], [(1, 10), (10, 3), (25, 7)])
+def test_get_player_scores_cursor(num, limit, auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    games = GameFactory.create_batch(3)
+    player_scores = [
+        PlayerScoreFactory(user=user, game=games[i % 3]) for i in range(num)
+    ]
+    sorted_scores = sorted(player_scores, key=lambda x: (x.game_id, x.created_at, x.id))
+
+    # walk every score forwards
+    results = []
+    pages = []
+    url = f"/scores?cursor=&limit={limit}"
+    while url:
+        response = auth_client.get(url)
+        assert response.status_code == 200 and "count" not in response.data
+        results += response.data["results"]
+        pages.append(response.data)
+        url = response.data["next"]
+
+    assert pages[0]["previous"] is None and [data["id"] for data in results] == [
+        score.id for score in sorted_scores
+    ]
+
+    # walk back from the last page
+    if len(pages) > 1:
+        response = auth_client.get(pages[-1]["previous"])
+        assert response.data["results"] == pages[-2]["results"]
+
+
+def test_get_player_high_scores_cursor(auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    high_scores = [PlayerHighScoreFactory(user=user) for _ in range(5)]
+
+    response = auth_client.get("/high-scores?cursor=&limit=3")
+    assert [data["game"]["id"] for data in response.data["results"]] == [
+        phs.game_id for phs in high_scores[:3]
+    ]
+    response = auth_client.get(response.data["next"])
+    assert response.data["next"] is None and [
+        data["game"]["id"] for data in response.data["results"]
+    ] == [phs.game_id for phs in high_scores[3:]]
+
+
 @pytest.mark.parametrize(
     "num",
     [1, 10, 100],
@@ -160,6 +569,77 @@ def test_get_signed_scores(num, auth_client):
     )
 
 
+def test_get_signed_scores_stored(auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    player_scores = PlayerScoreFactory.create_batch(5, user=user)
+    ids = [score.id for score in player_scores]
+
+    # older scores are signed and stored on first request
+    response = auth_client.post("/scores/sign", data={"ids": ids})
+    stored = {
+        score.id: score
+        for score in PlayerScore.objects.filter(id__in=ids).select_related("game")
+    }
+    assert all(
+        stored[score.id].nonce == data["nonce"]
+        and stored[score.id].signature
+        == data["signature"]
+        == sign_score(
+            score.game.name,
+            score.game.eth_address,
+            score.game.signing_key,
+            user.eth_address,
+            score.score,
+            data["nonce"],
+        )
+        for score, data in zip(player_scores, response.data)
+    )
+
+    # later requests are a single read
+    with CaptureQueriesContext(connection) as context:
+        second = auth_client.post("/scores/sign", data={"ids": ids})
+    assert second.data == response.data and not [
+        q for q in context.captured_queries if "UPDATE" in q["sql"]
+    ]
+
+
+def test_get_signed_scores_consumed(auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    player_scores = PlayerScoreFactory.create_batch(3, user=user)
+    ConsumedNonce.objects.create(
+        game=player_scores[1].game, nonce=score_nonce(player_scores[1].id)
+    )
+
+    response = auth_client.post(
+        "/scores/sign", data={"ids": [score.id for score in player_scores]}
+    )
+    assert (
+        response.status_code == 400
+        and not PlayerScore.objects.exclude(signature="").exists()
+    )
+
+
+def test_get_signed_scores_query_budget(auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+
+    counts = []
+    for num in [3, 10, 50]:
+        games = GameFactory.create_batch(3)
+        player_scores = [
+            PlayerScoreFactory(user=user, game=games[i % 3]) for i in range(num)
+        ]
+        ids = [score.id for score in player_scores]
+
+        # unsigned and already signed scores both cost the same no matter how many
+        for _ in range(2):
+            with CaptureQueriesContext(connection) as context:
+                response = auth_client.post("/scores/sign", data={"ids": ids})
+            assert response.status_code == 200 and len(response.data) == num
+            counts.append(len(context.captured_queries))
+
+    assert counts[0::2] == [counts[0]] * 3 and counts[1::2] == [counts[1]] * 3
+
+
 @pytest.mark.parametrize(
     "num",
     [1, 10, 100],
@@ -180,6 +660,92 @@ def test_delete_signed_scores(num, auth_client):
     )
 
 
+def _join_game_servers(client):
+    group, _ = Group.objects.get_or_create(name=settings.GAME_SERVER_GROUP)
+    User.objects.get(eth_address__iexact=client.eth_address).groups.add(group)
+
+
+def test_batch_scores(auth_client, settings):
+    settings.SCORE_BATCH_CHUNK_SIZE = 100
+    _join_game_servers(auth_client)
+    games = GameFactory.create_batch(3)
+    users = UserFactory.create_batch(10)
+    scores = [
+        {
+            "player": users[i % 10].eth_address.upper().replace("0X", "0x"),
+            "game": games[i % 3].eth_address,
+            "score": i,
+        }
+        for i in range(250)
+    ]
+
+    with CaptureQueriesContext(connection) as context:
+        response = auth_client.post(
+            "/scores/batch", data={"scores": scores}, format="json"
+        )
+
+    # auth, one lookup each for players and games, three insert chunks and signing
+    inserts = [q for q in context.captured_queries if q["sql"].startswith("INSERT")]
+    created = PlayerScore.objects.filter(id__in=response.data["ids"])
+    assert (
+        response.status_code == 201
+        and len(response.data["ids"]) == 250
+        and len(inserts) == 3
+        and created.count() == 250
+        and not created.filter(signature="").exists()
+    )
+    score = created.get(score=42)
+    assert score.user == users[2] and score.game == games[0]
+
+
+def test_batch_scores_unknown(auth_client):
+    _join_game_servers(auth_client)
+    game = GameFactory()
+    user = UserFactory()
+    unknown = "0x" + "ab" * 20
+
+    response = auth_client.post(
+        "/scores/batch",
+        data={
+            "scores": [
+                {"player": user.eth_address, "game": game.eth_address, "score": 1},
+                {"player": unknown, "game": game.eth_address, "score": 2},
+            ]
+        },
+        format="json",
+    )
+
+    assert (
+        response.status_code == 400
+        and response.data["errors"][0]["attr"] == "players"
+        and unknown in response.data["errors"][0]["detail"]
+        and not PlayerScore.objects.exists()
+    )
+
+
+@pytest.mark.parametrize("is_staff", [False, True])
+def test_batch_scores_game_servers_only(is_staff, auth_client):
+    # staff accounts aren't game servers unless they're in the group
+    User.objects.filter(eth_address__iexact=auth_client.eth_address).update(
+        is_staff=is_staff
+    )
+    game = GameFactory()
+    response = auth_client.post(
+        "/scores/batch",
+        data={
+            "scores": [
+                {
+                    "player": auth_client.eth_address,
+                    "game": game.eth_address,
+                    "score": 1,
+                }
+            ]
+        },
+        format="json",
+    )
+    assert response.status_code == 403 and not PlayerScore.objects.exists()
+
+
 def test_get_ticket_metadata(api_client):
     response = api_client.get("/ticket/metadata")
     assert (
@@ -188,3 +754,78 @@ def test_get_ticket_metadata(api_client):
         and response.data["description"] == settings.TICKET_DESCRIPTION
         and response.data["image"] == settings.TICKET_IMAGE_URL
     )
+
+
+@pytest.mark.parametrize("num", [0, 1, 50])
+def test_export_leaderboard(num, api_client, settings):
+    settings.LEADERBOARD_EXPORT_CHUNK_SIZE = 7
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(num, game=game)
+    PlayerHighScoreFactory.create_batch(3)
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+    expected = [
+        (rank, phs.user.username, phs.user.eth_address, phs.score, phs.token_id)
+        for rank, phs in enumerate(sorted_high_scores, start=1)
+    ]
+
+    # csv
+    response = api_client.get(f"/leaderboard/{game.id}/export.csv")
+    assert response.status_code == 200 and response.streaming
+    rows = list(
+        csv.DictReader(b"".join(response.streaming_content).decode().splitlines())
+    )
+    assert [
+        (
+            int(row["rank"]),
+            row["username"],
+            row["eth_address"],
+            int(row["score"]),
+            int(row["token_id"]),
+        )
+        for row in rows
+    ] == expected
+
+    # ndjson
+    response = api_client.get(f"/leaderboard/{game.id}/export.ndjson")
+    assert response.status_code == 200 and response.streaming
+    rows = [
+        json.loads(line) for line in b"".join(response.streaming_content).splitlines()
+    ]
+    assert [
+        (
+            row["rank"],
+            row["username"],
+            row["eth_address"],
+            row["score"],
+            row["token_id"],
+        )
+        for row in rows
+    ] == expected
+
+
+@pytest.mark.parametrize(
+    ["export_format", "accept"],
+    [("csv", "text/csv"), ("ndjson", "application/x-ndjson")],
+)
+def test_export_leaderboard_accept(export_format, accept, api_client):
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(3, game=game)
+
+    # clients asking for the format they are downloading get it
+    response = api_client.get(
+        f"/leaderboard/{game.id}/export.{export_format}", HTTP_ACCEPT=accept
+    )
+    assert (
+        response.status_code == 200
+        and response["Content-Type"] == accept
+        and len(b"".join(response.streaming_content).splitlines())
+        == (4 if export_format == "csv" else 3)
+    )
+
+
+def test_export_leaderboard_404(api_client):
+    response = api_client.get("/leaderboard/420/export.csv")
+    assert response.status_code == 404
+
+    response = api_client.get("/leaderboard/420/export.csv", HTTP_ACCEPT="text/csv")
+    assert response.status_code == 404 and response.json()["errors"]
@@ -1,8 +1,19 @@
+import random
+
 import pytest
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 
-from games.models import Game, PlayerHighScore, PlayerScore
+from games.models import Game, PlayerHighScore, PlayerScore, PlayerSummary
+from tests.factories import (
+    GameFactory,
+    PlayerHighScoreFactory,
+    PlayerScoreFactory,
+    UserFactory,
+)
 
 User = get_user_model()
 
@@ -24,3 +35,240 @@ def test_not_unique_score():
     PlayerScore.objects.create(user=user, game=game, score=1)
     PlayerScore.objects.create(user=user, game=game, score=10)
     PlayerScore.objects.create(user=user, game=game, score=100)
+
+
+def test_game_signing_change_clears_signatures():
+    score = PlayerScoreFactory()
+    PlayerScore.objects.filter(id=score.id).update(nonce="0x1", signature="0x2")
+
+    # unrelated changes keep them
+    game = score.game
+    game.description = "new description"
+    game.save()
+    score.refresh_from_db()
+    assert score.signature == "0x2"
+
+    game.signing_key = f"0x{'1' * 64}"
+    game.save()
+    score.refresh_from_db()
+    assert score.nonce == "0x1" and score.signature == ""
+
+
+def _assert_ranked(game):
+    high_scores = PlayerHighScore.objects.filter(game=game).order_by("-score", "id")
+    assert [phs.rank for phs in high_scores] == list(range(1, len(high_scores) + 1))
+
+
+def test_high_score_rank():
+    game = GameFactory()
+    other_game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(30, game=game)
+    PlayerHighScoreFactory.create_batch(5, game=other_game)
+    _assert_ranked(game)
+
+    # raise, lower, tie and keep scores
+    for phs, score in zip(
+        random.sample(high_scores, k=20),
+        [random.randint(0, 10_000) for _ in range(15)] + [high_scores[0].score] * 5,
+    ):
+        phs.score = score
+        phs.save()
+        _assert_ranked(game)
+
+    # saving without moving keeps ranks that changed since the row was loaded
+    for phs in high_scores:
+        phs.save()
+    _assert_ranked(game)
+
+    # new players join at the bottom
+    PlayerHighScoreFactory.create_batch(3, game=game, score=0)
+    _assert_ranked(game)
+
+    # players leave
+    for phs in random.sample(high_scores, k=5):
+        phs.delete()
+    _assert_ranked(game)
+    _assert_ranked(other_game)
+
+
+def test_high_score_rerank():
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(10, game=game)
+    PlayerHighScore.objects.filter(game=game).update(rank=0)
+
+    PlayerHighScore.rerank(game.id)
+    _assert_ranked(game)
+
+
+def test_high_score_upsert_many():
+    game = GameFactory()
+    other_game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+    PlayerHighScoreFactory.create_batch(3, game=other_game)
+    raised, lowered = high_scores[:2]
+    new_users = UserFactory.create_batch(3)
+    top = max(phs.score for phs in high_scores)
+
+    changed = PlayerHighScore.upsert_many(
+        [
+            (raised.user_id, game.id, raised.token_id, top + 10),
+            # lower scores and repeats never win
+            (lowered.user_id, game.id, lowered.token_id, 0),
+            (raised.user_id, game.id, raised.token_id, 1),
+            # new players, registered and scored in the same batch
+            *[(user.id, game.id, 100 + i, 0) for i, user in enumerate(new_users)],
+            (new_users[0].id, game.id, 100, top + 5),
+            (new_users[1].id, other_game.id, 200, 7),
+        ]
+    )
+
+    raised.refresh_from_db()
+    lowered_score = lowered.score
+    lowered.refresh_from_db()
+    assert (
+        {(phs.user_id, phs.game_id) for phs in changed}
+        == {(raised.user_id, game.id), (new_users[1].id, other_game.id)}
+        | {(user.id, game.id) for user in new_users}
+        and raised.score == top + 10
+        and raised.rank == 1
+        and lowered.score == lowered_score
+        and PlayerHighScore.objects.get(user=new_users[0], game=game).rank == 2
+        and PlayerSummary.objects.get(user=new_users[0]).total_score == top + 5
+        and PlayerSummary.objects.get(user=new_users[1]).games_played == 2
+    )
+    _assert_ranked(game)
+    _assert_ranked(other_game)
+
+
+def test_high_score_upsert_many_ranks():
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(30, game=game)
+    users = UserFactory.create_batch(10)
+
+    # raises, ties, new players and repeats, in random batches
+    for _ in range(10):
+        rows = [
+            (phs.user_id, game.id, phs.token_id, phs.score + random.randint(0, 50))
+            for phs in random.sample(high_scores, k=5)
+        ] + [
+            (user.id, game.id, 100 + i, random.choice(high_scores).score)
+            for i, user in enumerate(random.sample(users, k=2))
+        ]
+        changed = PlayerHighScore.upsert_many(rows)
+        _assert_ranked(game)
+        assert all(
+            phs.rank == PlayerHighScore.objects.get(id=phs.id).rank for phs in changed
+        )
+
+
+def test_high_score_upsert_many_span():
+    game = GameFactory()
+    for i in range(100):
+        PlayerHighScoreFactory(game=game, score=i * 10)
+    sorted_high_scores = list(
+        PlayerHighScore.objects.filter(game=game).order_by("-score", "id")
+    )
+
+    # only the ranks between the old and new place move
+    phs = sorted_high_scores[59]
+    changed = [
+        PlayerHighScore(
+            id=phs.id, game_id=game.id, score=sorted_high_scores[49].score + 1
+        )
+    ]
+    PlayerHighScore.objects.filter(id=phs.id).update(score=changed[0].score)
+    assert PlayerHighScore._shift_ranks(game.id, changed, {phs.id: 60}) == 10
+
+    PlayerHighScore._rank_changed(changed)
+    _assert_ranked(game)
+    assert changed[0].rank == 50
+
+
+def test_high_score_upsert_many_queries():
+    games = GameFactory.create_batch(2)
+    for game in games:
+        PlayerHighScoreFactory.create_batch(5, game=game)
+
+    def upsert(num: int) -> int:
+        users = UserFactory.create_batch(num)
+        with CaptureQueriesContext(connection) as context:
+            PlayerHighScore.upsert_many(
+                [
+                    (user.id, games[i % 2].id, i, 1000 + i)
+                    for i, user in enumerate(users)
+                ]
+            )
+        return len(context.captured_queries)
+
+    # ranks and totals are written per batch, not per row
+    assert upsert(10) == upsert(40)
+    for game in games:
+        _assert_ranked(game)
+
+
+def test_player_summary():
+    user = UserFactory()
+    games = GameFactory.create_batch(3)
+    high_scores = [
+        PlayerHighScoreFactory(user=user, game=game, score=score)
+        for game, score in zip(games, [100, 200, 300])
+    ]
+    PlayerHighScoreFactory(game=games[0], score=1000)
+
+    summary = PlayerSummary.objects.get(user=user)
+    assert (
+        summary.total_score == 600
+        and summary.games_played == 3
+        and summary.best_rank == 1
+    )
+
+    # raise a score, then drop out of a game
+    high_scores[0].score = 150
+    high_scores[0].save()
+    high_scores[2].delete()
+
+    summary.refresh_from_db()
+    assert (
+        summary.total_score == 350
+        and summary.games_played == 2
+        and summary.best_rank == 1
+    )
+
+
+def test_player_summary_rebuild():
+    users = UserFactory.create_batch(2)
+    games = GameFactory.create_batch(3)
+    for game, score in zip(games, [100, 200, 300]):
+        PlayerHighScoreFactory(user=users[0], game=game, score=score)
+    PlayerHighScoreFactory(user=users[1], game=games[2], score=1000)
+
+    # cascade deletes skip `PlayerHighScore.delete()`
+    games[2].delete()
+    summaries = {s.user_id: s for s in PlayerSummary.objects.all()}
+    assert (
+        summaries[users[0].id].total_score == 300
+        and summaries[users[0].id].games_played == 2
+        and summaries[users[1].id].total_score == 0
+        and summaries[users[1].id].games_played == 0
+        # the best rank ever reached is kept
+        and summaries[users[1].id].best_rank == 1
+    )
+
+    # queryset writes are caught up by a rebuild
+    PlayerHighScore.objects.filter(game=games[0]).delete()
+    PlayerSummary.objects.update(total_score=42, games_played=42, best_rank=42)
+    PlayerSummary.objects.filter(user=users[1]).update(best_rank=None)
+    call_command("rebuild_summaries")
+    summaries = {s.user_id: s for s in PlayerSummary.objects.all()}
+    assert (
+        summaries[users[0].id].total_score == 200
+        and summaries[users[0].id].games_played == 1
+        # lowered to the current rank, never raised to it
+        and summaries[users[0].id].best_rank == 1
+        and summaries[users[1].id].total_score == 0
+        and summaries[users[1].id].best_rank is None
+    )
+    PlayerSummary.objects.filter(user=users[0]).update(best_rank=1)
+    PlayerHighScoreFactory(user=users[1], game=games[1], score=10_000)
+    call_command("rebuild_summaries")
+    assert PlayerSummary.objects.get(user=users[0]).best_rank == 1
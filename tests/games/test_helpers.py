@@ -0,0 +1,50 @@
+from secrets import token_hex
+
+import pytest
+from django.core.management import call_command
+
+from games.helpers import get_score_signer, sign_score, sign_scores
+from games.management.commands.benchmark_score_signing import sign_typed_data
+
+
+@pytest.mark.parametrize("score", [0, 1, 420, 2**256 - 1])
+def test_sign_score(score):
+    game = ("Game", f"0x{token_hex(20)}", f"0x{token_hex(32)}")
+    for _ in range(10):
+        score_data = (f"0x{token_hex(20)}", score, f"0x{token_hex(32)}")
+        assert sign_score(*game, *score_data) == sign_typed_data(*game, *score_data)
+
+
+def test_sign_score_chain_id(settings):
+    game = ("Game", f"0x{token_hex(20)}", f"0x{token_hex(32)}")
+    score_data = (f"0x{token_hex(20)}", 100, f"0x{token_hex(32)}")
+    signature = sign_score(*game, *score_data)
+
+    # signers are cached per game and chain
+    settings.APP_CHAIN_ID = int(settings.APP_CHAIN_ID) + 1
+    assert (
+        sign_score(*game, *score_data) != signature
+        and sign_score(*game, *score_data) == sign_typed_data(*game, *score_data)
+        and get_score_signer.cache_info().currsize >= 2
+    )
+
+
+@pytest.mark.parametrize("gevent_patched", [False, True])
+def test_sign_scores(gevent_patched, monkeypatch, settings):
+    settings.SCORE_SIGNING_CHUNK_SIZE = 4
+    monkeypatch.setattr(
+        "gevent.monkey.is_module_patched", lambda module: gevent_patched
+    )
+    games = [("Game", f"0x{token_hex(20)}", f"0x{token_hex(32)}") for _ in range(3)]
+    scores = [
+        (*games[i % 3], f"0x{token_hex(20)}", i, f"0x{token_hex(32)}")
+        for i in range(30)
+    ]
+
+    assert sign_scores(scores) == [sign_score(*score) for score in scores]
+    assert sign_scores([]) == []
+
+
+def test_benchmark_score_signing(capsys):
+    call_command("benchmark_score_signing", "-n", "20")
+    assert "Signatures are identical" in capsys.readouterr().out
@@ -0,0 +1,141 @@
+import math
+import random
+
+import pytest
+
+from games.leaderboard import (
+    GameLeaderboard,
+    LeaderboardEntry,
+    get_leaderboard,
+    record_high_score,
+)
+from tests.factories import GameFactory, PlayerHighScoreFactory
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+def _entries(num: int) -> list[LeaderboardEntry]:
+    return [
+        LeaderboardEntry(id=i, user_id=100 + i, token_id=1000 + i, score=score)
+        for i, score in enumerate(random.choices(range(50), k=num), start=1)
+    ]
+
+
+def _expected(entries: list[LeaderboardEntry]) -> list[int]:
+    return [entry.id for entry in sorted(entries, key=lambda x: (-x.score, x.id))]
+
+
+@pytest.mark.parametrize("num", [0, 1, 10, 100])
+def test_leaderboard_order(num):
+    entries = _entries(num)
+    leaderboard = GameLeaderboard(1, entries)
+    expected = _expected(entries)
+
+    assert (
+        len(leaderboard) == num
+        and [entry.id for entry in leaderboard.top(num)] == expected
+        and [entry.id for entry in leaderboard.top(3)] == expected[:3]
+        and [entry.id for entry in leaderboard.range_by_rank(3, 6)] == expected[2:5]
+        and all(
+            leaderboard.rank_of_user(entry.user_id) == expected.index(entry.id) + 1
+            and leaderboard.entry_for_token(entry.token_id) is entry
+            for entry in entries
+        )
+        and leaderboard.rank_of_user(-1) is None
+    )
+
+
+def test_leaderboard_update():
+    entries = _entries(50)
+    leaderboard = GameLeaderboard(1, entries)
+
+    # raise some scores and add new players
+    for entry in random.sample(entries, k=10):
+        entry = LeaderboardEntry(entry.id, entry.user_id, entry.token_id, 100)
+        entries[entry.id - 1] = entry
+        leaderboard.update(entry)
+    for i in range(51, 56):
+        entry = LeaderboardEntry(i, 100 + i, 1000 + i, 0)
+        entries.append(entry)
+        leaderboard.update(entry)
+
+    assert [entry.id for entry in leaderboard.top(len(entries))] == _expected(
+        entries
+    ) and all(leaderboard.entry_for_user(entry.user_id) == entry for entry in entries)
+
+
+@pytest.mark.parametrize(["num", "buckets"], [(0, 10), (1, 10), (100, 7), (500, 1)])
+def test_leaderboard_distribution(num, buckets):
+    entries = _entries(num)
+    leaderboard = GameLeaderboard(1, entries)
+    scores = sorted(entry.score for entry in entries)
+
+    distribution = leaderboard.distribution
+    histogram = distribution.histogram(buckets)
+
+    assert (
+        len(distribution) == num
+        and all(
+            distribution.percentile(p)
+            == (scores[max(math.ceil(p / 100 * num) - 1, 0)] if scores else None)
+            for p in (0, 50, 90, 99, 100)
+        )
+        and all(
+            distribution.percentile_of(entry.score)
+            == len([s for s in scores if s < entry.score]) / num * 100
+            for entry in entries
+        )
+        and len(histogram) <= buckets
+        and sum(bucket["count"] for bucket in histogram) == num
+        and all(
+            bucket["count"]
+            == len([s for s in scores if bucket["min"] <= s <= bucket["max"]])
+            for bucket in histogram
+        )
+    )
+
+
+def test_leaderboard_distribution_update():
+    entries = _entries(50)
+    leaderboard = GameLeaderboard(1, entries)
+    distribution = leaderboard.distribution
+    assert leaderboard.distribution is distribution
+
+    # a new top score invalidates the distribution
+    leaderboard.update(LeaderboardEntry(51, 151, 1051, 1000))
+    assert (
+        leaderboard.distribution is not distribution
+        and len(leaderboard.distribution) == 51
+        and leaderboard.distribution.percentile(100) == 1000
+    )
+
+
+def test_get_leaderboard_lazy_load(django_assert_num_queries):
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+
+    with django_assert_num_queries(2):
+        leaderboard = get_leaderboard(game.id)
+    with django_assert_num_queries(0):
+        assert get_leaderboard(game.id) is leaderboard
+
+    assert [entry.id for entry in leaderboard.top(10)] == [
+        phs.id for phs in sorted(high_scores, key=lambda x: (-x.score, x.id))
+    ]
+
+
+def test_record_high_score():
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(10, game=game)
+    leaderboard = get_leaderboard(game.id)
+
+    # raise the lowest score to the top
+    phs = min(high_scores, key=lambda x: (x.score, -x.id))
+    phs.score = max(x.score for x in high_scores) + 1
+    phs.save()
+    record_high_score(phs)
+
+    assert (
+        get_leaderboard(game.id) is leaderboard
+        and leaderboard.rank_of_user(phs.user_id) == 1
+    )
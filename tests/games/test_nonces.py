@@ -0,0 +1,123 @@
+from datetime import timedelta
+from secrets import token_hex
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from freezegun import freeze_time
+
+from games.helpers import score_nonce
+from games.models import ConsumedNonce, PlayerScore
+from games.nonces import (
+    NonceFilter,
+    consumed_nonces,
+    consumed_scores,
+    get_nonce_filter,
+    record_consumed_nonces,
+)
+from tests.factories import GameFactory, PlayerScoreFactory
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+def test_nonce_filter():
+    nonces = [f"0x{token_hex(32)}" for _ in range(10_000)]
+    nonce_filter = NonceFilter(nonces)
+
+    # never a false negative, rarely a false positive
+    others = [f"0x{token_hex(32)}" for _ in range(10_000)]
+    false_positives = len([nonce for nonce in others if nonce in nonce_filter])
+    assert all(nonce in nonce_filter for nonce in nonces) and false_positives < 10
+
+
+def test_record_consumed_nonces(django_assert_num_queries):
+    game = GameFactory()
+    scores = PlayerScoreFactory.create_batch(10, game=game)
+    for score in scores:
+        PlayerScore.objects.filter(id=score.id).update(nonce=score_nonce(score.id))
+    nonces = [score_nonce(score.id) for score in scores]
+
+    # load the filter before anything is consumed
+    get_nonce_filter(game.id)
+    assert consumed_nonces(game.id, nonces) == set()
+
+    assert record_consumed_nonces(game.id, nonces[:4]) == 4
+    assert record_consumed_nonces(game.id, nonces[:4]) == 0
+
+    # nonces the filter rules out don't touch the db
+    with django_assert_num_queries(1):
+        assert consumed_nonces(game.id, nonces) == set(nonces[:4])
+    with django_assert_num_queries(0):
+        assert consumed_nonces(game.id, nonces[4:]) == set()
+
+    assert (
+        ConsumedNonce.objects.filter(game=game).count() == 4
+        and PlayerScore.objects.filter(game=game).count() == 6
+    )
+
+
+def test_consumed_scores():
+    game = GameFactory()
+    scores = PlayerScoreFactory.create_batch(4, game=game)
+    ConsumedNonce.objects.create(game=game, nonce=score_nonce(scores[1].id))
+
+    # scores without a stored nonce are checked by their derived one
+    assert consumed_scores(scores) == [scores[1]]
+
+
+def test_nonce_filter_refresh(settings, django_assert_num_queries):
+    settings.CONSUMED_NONCE_FILTER_BITS = 2**10
+    game = GameFactory()
+    ConsumedNonce.objects.bulk_create(
+        ConsumedNonce(game=game, nonce=f"0x{token_hex(32)}") for _ in range(50)
+    )
+    nonce_filter = get_nonce_filter(game.id)
+    assert nonce_filter.size == 2**10 and nonce_filter.count == 50
+
+    # nonces recorded on other workers are picked up without reading the rest again
+    settings.CONSUMED_NONCE_FILTER_TTL = timedelta(0)
+    added = ConsumedNonce.objects.create(game=game, nonce=f"0x{token_hex(32)}")
+    with CaptureQueriesContext(connection) as context:
+        assert get_nonce_filter(game.id) is nonce_filter
+    assert (
+        added.nonce in nonce_filter
+        and nonce_filter.count == 51
+        and len(context.captured_queries) == 1
+    )
+
+    # a filter that outgrows its size is rebuilt larger
+    ConsumedNonce.objects.bulk_create(
+        ConsumedNonce(game=game, nonce=f"0x{token_hex(32)}") for _ in range(100)
+    )
+    rebuilt = get_nonce_filter(game.id)
+    assert (
+        rebuilt is not nonce_filter
+        and rebuilt.count == 151
+        and rebuilt.count <= rebuilt.capacity // 2
+        and all(
+            nonce in rebuilt
+            for nonce in ConsumedNonce.objects.values_list("nonce", flat=True)
+        )
+    )
+
+
+def test_prune_consumed_nonces(settings):
+    game = GameFactory()
+    scores = PlayerScoreFactory.create_batch(2, game=game)
+    for score in scores:
+        PlayerScore.objects.filter(id=score.id).update(nonce=score_nonce(score.id))
+    record_consumed_nonces(game.id, [score_nonce(scores[0].id)])
+
+    # a score stored after its nonce was consumed keeps the nonce around
+    ConsumedNonce.objects.create(game=game, nonce=score_nonce(scores[1].id))
+
+    call_command("prune_consumed_nonces")
+    assert ConsumedNonce.objects.count() == 2
+
+    with freeze_time(now() + settings.CONSUMED_NONCE_RETENTION):
+        call_command("prune_consumed_nonces")
+    assert list(ConsumedNonce.objects.values_list("nonce", flat=True)) == [
+        score_nonce(scores[1].id)
+    ]
@@ -0,0 +1,117 @@
+"""
+Query plan regression suite. Seeds a leaderboard, captures the queries each endpoint runs
+and EXPLAINs them, failing if any of them falls back to a sequential scan or a sort of
+the high scores table. Runs against sqlite and postgres (sequential scans are disabled on
+postgres so the planner only picks one when no index can serve the query).
+"""
+
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from games.models import PlayerHighScore
+from tests.factories import GameFactory
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+User = get_user_model()
+
+TABLE = PlayerHighScore._meta.db_table
+
+
+@pytest.fixture()
+def seeded_game():
+    game = GameFactory(eth_address=settings.KYM_GAME_ADDRESS.lower())
+    other_game = GameFactory()
+
+    users = User.objects.bulk_create(
+        [User(username=f"player-{i}", eth_address=f"0x{i:040x}") for i in range(500)]
+    )
+    PlayerHighScore.objects.bulk_create(
+        [
+            PlayerHighScore(user=user, game=g, score=(i * 7919) % 1000, token_id=i)
+            for g in [game, other_game]
+            for i, user in enumerate(users)
+        ]
+    )
+    PlayerHighScore.rerank(game.id)
+    PlayerHighScore.rerank(other_game.id)
+
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {TABLE}")
+
+    return game
+
+
+def explain(sql: str) -> list[str]:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("SET enable_seqscan = off")
+            try:
+                cursor.execute(f"EXPLAIN {sql}")
+            finally:
+                cursor.execute("RESET enable_seqscan")
+            return [row[0] for row in cursor.fetchall()]
+
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def assert_no_scans(ctx: CaptureQueriesContext):
+    queries = [
+        query["sql"]
+        for query in ctx.captured_queries
+        if query["sql"].startswith("SELECT") and TABLE in query["sql"]
+    ]
+    assert queries, "no queries hit the high scores table"
+
+    for sql in queries:
+        plan = explain(sql)
+        if connection.vendor == "postgresql":
+            bad = [
+                line
+                for line in plan
+                if f"Seq Scan on {TABLE}" in line or "Sort Key" in line
+            ]
+        else:
+            bad = [
+                line
+                for line in plan
+                if line.startswith(f"SCAN {TABLE}") or "TEMP B-TREE" in line
+            ]
+        assert not bad, f"{sql}\n\n" + "\n".join(plan)
+
+
+def test_leaderboard_query_plans(seeded_game, api_client):
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get(f"/leaderboard/{seeded_game.id}?offset=100")
+    assert response.status_code == 200
+    assert_no_scans(ctx)
+
+
+def test_leaderboard_cursor_query_plans(seeded_game, api_client):
+    response = api_client.get(f"/leaderboard/{seeded_game.id}?cursor=")
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get(response.data["next"])
+    assert response.status_code == 200
+    assert_no_scans(ctx)
+
+
+def test_leaderboard_rank_query_plans(seeded_game, auth_client):
+    user = User.objects.get(eth_address__iexact=auth_client.eth_address)
+    PlayerHighScore.objects.create(user=user, game=seeded_game, score=500, token_id=-1)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = auth_client.get(f"/leaderboard/{seeded_game.id}/me")
+    assert response.status_code == 200
+    assert_no_scans(ctx)
+
+
+def test_kym_metadata_query_plans(seeded_game, api_client):
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get("/kym/metadata/42")
+    assert response.status_code == 200
+    assert_no_scans(ctx)
@@ -0,0 +1,166 @@
+import random
+from datetime import timedelta
+
+import pytest
+from django.core.management import call_command
+from django.utils.timezone import now
+from freezegun import freeze_time
+
+from games.models import LeaderboardSnapshot
+from games.snapshots import (
+    _snapshots,
+    clear_snapshots,
+    decode_deltas,
+    encode_deltas,
+    load_snapshot,
+    take_snapshot,
+)
+from tests.factories import GameFactory, PlayerHighScoreFactory
+
+pytestmark = [pytest.mark.django_db(transaction=True)]
+
+
+@pytest.mark.parametrize(
+    "values",
+    [
+        [],
+        [0],
+        [2**63 - 1, 0, -(2**63)],
+        sorted(random.choices(range(1_000_000), k=1000), reverse=True),
+        random.choices(range(-1000, 1000), k=1000),
+    ],
+)
+def test_delta_encoding(values):
+    assert decode_deltas(encode_deltas(values)) == values
+
+
+def test_delta_encoding_is_compact():
+    scores = sorted(random.choices(range(100_000), k=10_000), reverse=True)
+    assert len(encode_deltas(scores)) < len(scores) * 2
+
+
+def test_take_snapshot():
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(20, game=game)
+    PlayerHighScoreFactory.create_batch(3)
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+    expected = [(phs.user_id, phs.score, phs.token_id) for phs in sorted_high_scores]
+
+    snapshot = take_snapshot(game.id, block_number=100)
+
+    # later changes don't touch the snapshot
+    high_scores[0].score += 10_000
+    high_scores[0].save()
+
+    entries = load_snapshot(snapshot.id)
+    assert (
+        snapshot.size == 20
+        and list(zip(entries.user_ids, entries.scores, entries.token_ids)) == expected
+        and all(
+            entries.rank_of_user(user_id) == rank
+            for rank, (user_id, _, _) in enumerate(expected, start=1)
+        )
+    )
+
+
+def test_snapshot_cache_is_bounded(settings):
+    settings.SNAPSHOT_CACHE_MAX_ROWS = 25
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(10, game=game)
+    snapshots = [take_snapshot(game.id) for _ in range(3)]
+
+    # only two boards of ten fit, the least recently used one is dropped
+    first = load_snapshot(snapshots[0].id)
+    load_snapshot(snapshots[1].id)
+    assert load_snapshot(snapshots[0].id) is first
+    load_snapshot(snapshots[2].id)
+    assert list(_snapshots) == [snapshots[0].id, snapshots[2].id]
+
+    # boards bigger than the whole cache are decoded but never kept
+    settings.SNAPSHOT_CACHE_MAX_ROWS = 5
+    clear_snapshots()
+    assert len(load_snapshot(snapshots[0].id)) == 10 and not _snapshots
+
+
+def test_snapshot_command():
+    games = GameFactory.create_batch(2)
+    for game in games:
+        PlayerHighScoreFactory.create_batch(5, game=game)
+
+    call_command("snapshot_leaderboards", "--block", "42")
+    call_command("snapshot_leaderboards", "--game", str(games[0].id))
+
+    assert (
+        LeaderboardSnapshot.objects.filter(game=games[0]).count() == 2
+        and LeaderboardSnapshot.objects.filter(game=games[1]).count() == 1
+        and LeaderboardSnapshot.objects.filter(block_number=42).count() == 2
+    )
+
+
+def test_get_snapshots(api_client):
+    game = GameFactory()
+    PlayerHighScoreFactory.create_batch(5, game=game)
+
+    snapshots = []
+    for i in range(3):
+        with freeze_time(now() + timedelta(days=i)):
+            snapshots.append(take_snapshot(game.id, block_number=100 * (i + 1)))
+
+    response = api_client.get(f"/leaderboard/{game.id}/snapshots")
+    assert response.status_code == 200 and [
+        data["id"] for data in response.data["results"]
+    ] == [snapshot.id for snapshot in reversed(snapshots)]
+
+    # as of a block
+    response = api_client.get(f"/leaderboard/{game.id}/snapshots?block=250")
+    assert response.data["results"][0]["id"] == snapshots[1].id
+
+    # as of a time
+    timestamp = (snapshots[0].created_at + timedelta(hours=1)).isoformat()
+    response = api_client.get(
+        f"/leaderboard/{game.id}/snapshots", {"timestamp": timestamp}
+    )
+    assert [data["id"] for data in response.data["results"]] == [snapshots[0].id]
+
+
+def test_get_snapshot_entries(api_client):
+    game = GameFactory()
+    high_scores = PlayerHighScoreFactory.create_batch(30, game=game)
+    sorted_high_scores = sorted(high_scores, key=lambda x: (-x.score, x.id))
+    snapshot = take_snapshot(game.id)
+
+    response = api_client.get(f"/leaderboard/snapshots/{snapshot.id}?offset=10&limit=5")
+    assert (
+        response.status_code == 200
+        and response.data["count"] == 30
+        and [
+            (data["rank"], data["username"], data["score"], data["token_id"])
+            for data in response.data["results"]
+        ]
+        == [
+            (rank, phs.user.username, phs.score, phs.token_id)
+            for rank, phs in enumerate(sorted_high_scores, start=1)
+        ][10:15]
+    )
+
+    # historical rank of a player
+    phs = sorted_high_scores[7]
+    response = api_client.get(
+        f"/leaderboard/snapshots/{snapshot.id}/rank?eth_address={phs.user.eth_address}"
+    )
+    assert (
+        response.status_code == 200
+        and response.data["rank"] == 8
+        and response.data["score"] == phs.score
+    )
+
+    # player not in the snapshot
+    other = PlayerHighScoreFactory()
+    response = api_client.get(
+        f"/leaderboard/snapshots/{snapshot.id}/rank?eth_address={other.user.eth_address}"
+    )
+    assert response.status_code == 404
+
+    # snapshot that doesn't exist
+    response = api_client.get("/leaderboard/snapshots/420")
+    assert response.status_code == 404
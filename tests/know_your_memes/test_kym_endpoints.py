@@ -6,6 +6,8 @@ from django.contrib.auth import get_user_model
 from django.utils.timezone import now
 from freezegun import freeze_time
 
+from games.helpers import score_nonce, sign_score
+from games.models import PlayerScore
 from know_your_memes.models import Gameplay, Question
 from know_your_memes.questions import QUESTIONS
 from tests.factories import GameFactory, PlayerHighScoreFactory
@@ -126,10 +128,23 @@ def test_submit_gameplay(wait_time, expected_score, auth_client):
     # done answering questions
     r = auth_client.post(f"/kym/gameplay/{gameplay.id}/submit")
 
+    # the score is signed once committed
+    score = PlayerScore.objects.get(user__eth_address__iexact=auth_client.eth_address)
+
     assert (
         r.status_code == 200
         and abs(r.data["total_score"] - expected_score) < 10
         and len(r.data["questions"]) == 5
+        and score.nonce == score_nonce(score.id)
+        and score.signature
+        == sign_score(
+            score.game.name,
+            score.game.eth_address,
+            score.game.signing_key,
+            score.user.eth_address,
+            score.score,
+            score.nonce,
+        )
     )
 
 
@@ -1,12 +1,34 @@
 import hmac
 import json
+from datetime import timedelta
 
 import pytest
 from django.contrib.auth import get_user_model
-
-from games.models import PlayerHighScore
-from tests.factories import GameFactory
-from webhooks.models import Webhook
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from freezegun import freeze_time
+
+from api.constants import SCORE_CONSUMED_TOPIC_0
+from games.helpers import score_nonce
+from games.leaderboard import get_leaderboard
+from games.models import (
+    ConsumedNonce,
+    LeaderboardChange,
+    PlayerHighScore,
+    PlayerScore,
+)
+from tests.factories import (
+    GameFactory,
+    PlayerHighScoreFactory,
+    PlayerScoreFactory,
+    UserFactory,
+)
+from webhooks.models import Webhook, WebhookEvent
+from webhooks.queue import process_pending
+from webhooks.registry import get_webhook
+from webhooks.views import scan_fields
 
 pytestmark = [pytest.mark.django_db(transaction=True)]
 
@@ -48,6 +70,16 @@ def test_invalid_signature(api_client):
 
     assert response.status_code == 400
 
+    # non-ASCII signatures are rejected rather than erroring
+    for signature in ["\u00e9" * 64, "\u2603" * 64]:
+        response = api_client.post(
+            "/games/index/player-high-score",
+            data,
+            headers={"x-alchemy-signature": signature},
+        )
+
+        assert response.status_code == 400
+
 
 def test_webhook_not_found(api_client):
     webhook = Webhook.objects.create(
@@ -189,3 +221,632 @@ def test_index_player_high_score(api_client):
     )
 
     assert phs.score == 3300
+
+
+def test_index_player_high_score_updates_leaderboard(api_client):
+    user = User.objects.create(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    game = GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    PlayerHighScoreFactory(user=user, game=game, score=0, token_id=1)
+    PlayerHighScoreFactory.create_batch(3, game=game, score=1000)
+
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # load the leaderboard before the score comes in
+    leaderboard = get_leaderboard(game.id)
+    assert leaderboard.rank_of_user(user.id) == 4
+
+    with open("tests/webhooks/high-score.json", "r") as f:
+        data = json.load(f)
+
+    signature = (
+        hmac.HMAC(
+            key=bytes(webhook.signing_key, "utf-8"),
+            msg=json.dumps(data).replace(" ", "").encode("utf-8"),
+            digestmod="sha256",
+        )
+        .digest()
+        .hex()
+    )
+
+    response = api_client.post(
+        "/games/index/player-high-score",
+        data,
+        headers={"x-alchemy-signature": signature},
+    )
+
+    assert (
+        response.status_code == 200
+        and get_leaderboard(game.id) is leaderboard
+        and leaderboard.rank_of_user(user.id) == 1
+        and leaderboard.entry_for_user(user.id).score == 3300
+    )
+
+
+def test_index_player_high_scores_batch(api_client):
+    game = GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    users = UserFactory.create_batch(20)
+    PlayerHighScoreFactory(user=users[0], game=game, score=5000, token_id=1)
+
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # a block where every player registers and scores, with a stale lower score
+    with open("tests/webhooks/register-and-high-score.json", "r") as f:
+        data = json.load(f)
+    registered, high_score = data["event"]["data"]["block"]["logs"]
+    logs = []
+    for i, user in enumerate(users, start=1):
+        player = f"0x{'0' * 24}{user.eth_address[2:]}"
+        logs += [
+            {**registered, "topics": [registered["topics"][0], player, f"0x{i:064x}"]},
+            {
+                **high_score,
+                "topics": [
+                    high_score["topics"][0],
+                    player,
+                    f"0x{i:064x}",
+                    f"0x{i * 100:064x}",
+                ],
+            },
+        ]
+    data["event"]["data"]["block"]["logs"] = logs
+
+    signature = (
+        hmac.HMAC(
+            key=bytes(webhook.signing_key, "utf-8"),
+            msg=json.dumps(data).replace(" ", "").encode("utf-8"),
+            digestmod="sha256",
+        )
+        .digest()
+        .hex()
+    )
+
+    response = api_client.post(
+        "/games/index/player-high-score",
+        data,
+        headers={"x-alchemy-signature": signature},
+    )
+
+    assert response.status_code == 200 and dict(
+        PlayerHighScore.objects.filter(game=game).values_list("user_id", "score")
+    ) == {
+        user.id: max(i * 100, 5000 if i == 1 else 0) for i, user in enumerate(users, 1)
+    }
+    assert list(
+        PlayerHighScore.objects.filter(game=game)
+        .order_by("-score", "id")
+        .values_list("rank", flat=True)
+    ) == list(range(1, 21))
+
+
+def test_index_score_consumed(api_client):
+    game = GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    scores = PlayerScoreFactory.create_batch(5, game=game)
+    other_game_score = PlayerScoreFactory()
+    consumed, kept = scores[:3], scores[3:]
+    for score in [*scores, other_game_score]:
+        PlayerScore.objects.filter(id=score.id).update(nonce=score_nonce(score.id))
+
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # consumed logs for this game, plus one from an unregistered game
+    with open("tests/webhooks/high-score.json", "r") as f:
+        data = json.load(f)
+    log = data["event"]["data"]["block"]["logs"][0]
+    logs = []
+    for score, address in [
+        *[(score, game.eth_address) for score in consumed],
+        (other_game_score, "0x0000000000000000000000000000000000000001"),
+    ]:
+        logs.append(
+            {
+                **log,
+                "topics": [
+                    SCORE_CONSUMED_TOPIC_0,
+                    f"0x{'0' * 24}{score.user.eth_address[2:]}",
+                    f"0x{score.score:064x}",
+                    score_nonce(score.id),
+                ],
+                "account": {"address": address},
+            }
+        )
+    data["event"]["data"]["block"]["logs"] = logs
+
+    signature = (
+        hmac.HMAC(
+            key=bytes(webhook.signing_key, "utf-8"),
+            msg=json.dumps(data).replace(" ", "").encode("utf-8"),
+            digestmod="sha256",
+        )
+        .digest()
+        .hex()
+    )
+
+    for _ in range(2):
+        response = api_client.post(
+            "/games/index/score-consumed",
+            data,
+            headers={"x-alchemy-signature": signature},
+        )
+        assert response.status_code == 200
+
+    assert set(ConsumedNonce.objects.values_list("nonce", flat=True)) == {
+        score_nonce(score.id) for score in consumed
+    } and set(PlayerScore.objects.values_list("id", flat=True)) == {
+        score.id for score in [*kept, other_game_score]
+    }
+
+
+def _post_event(api_client, path: str, fixture: str, webhook: Webhook):
+    with open(fixture, "r") as f:
+        data = json.load(f)
+
+    signature = (
+        hmac.HMAC(
+            key=bytes(webhook.signing_key, "utf-8"),
+            msg=json.dumps(data).replace(" ", "").encode("utf-8"),
+            digestmod="sha256",
+        )
+        .digest()
+        .hex()
+    )
+
+    return api_client.post(path, data, headers={"x-alchemy-signature": signature})
+
+
+def _spy_body_parses(monkeypatch) -> list[bytes]:
+    """Records the raw bodies passed to `json.loads`"""
+    loads = json.loads
+    parsed = []
+
+    def spy(s, **kwargs):
+        if isinstance(s, (bytes, bytearray)):
+            parsed.append(s)
+        return loads(s, **kwargs)
+
+    monkeypatch.setattr(json, "loads", spy)
+    return parsed
+
+
+def test_duplicate_event(api_client, monkeypatch):
+    user = User.objects.create(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    game = GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    response = _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/high-score.json",
+        webhook,
+    )
+    assert response.status_code == 200
+
+    # a retry is acknowledged without touching high scores or decoding the body
+    parsed = _spy_body_parses(monkeypatch)
+    PlayerHighScore.objects.filter(user=user, game=game).update(score=1)
+    with CaptureQueriesContext(connection) as context:
+        response = _post_event(
+            api_client,
+            "/games/index/player-high-score",
+            "tests/webhooks/high-score.json",
+            webhook,
+        )
+
+    assert (
+        response.status_code == 200
+        and PlayerHighScore.objects.get(user=user, game=game).score == 1
+        and not [q for q in context.captured_queries if "playerhighscore" in q["sql"]]
+        and WebhookEvent.objects.get().event_id == "whevt_e1c8kiu8xcal0gtd"
+        and not parsed
+    )
+
+
+def test_event_parsed_once(api_client, monkeypatch):
+    UserFactory(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+    parsed = _spy_body_parses(monkeypatch)
+
+    response = _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/high-score.json",
+        webhook,
+    )
+
+    assert (
+        response.status_code == 200
+        and WebhookEvent.objects.get().processed_at is not None
+        and len(parsed) == 1
+    )
+
+
+def test_out_of_order_event(api_client):
+    UserFactory(eth_address="0x181f59eb6490c8bf73d291af0d5a56dc90d7cd8b")
+    UserFactory(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # the later event arrives first, the earlier one is still processed
+    for fixture in ["register.json", "high-score.json"]:
+        response = _post_event(
+            api_client,
+            "/games/index/player-high-score",
+            f"tests/webhooks/{fixture}",
+            webhook,
+        )
+        assert response.status_code == 200
+
+    webhook.refresh_from_db()
+    earlier = WebhookEvent.objects.get(event_id="whevt_e1c8kiu8xcal0gtd")
+    assert (
+        webhook.last_sequence_number > earlier.sequence_number
+        and PlayerHighScore.objects.count() == 2
+        and WebhookEvent.objects.count() == 2
+    )
+
+
+def test_prune_webhook_events(settings):
+    settings.WEBHOOK_EVENT_PRUNE_CHUNK_SIZE = 2
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+    with freeze_time("2024-12-01"):
+        for i in range(5):
+            WebhookEvent.objects.create(
+                webhook=webhook, event_id=f"whevt_old_{i}", processed_at=now()
+            )
+        # still waiting on the worker
+        WebhookEvent.objects.create(webhook=webhook, event_id="whevt_pending")
+    with freeze_time("2024-12-07"):
+        WebhookEvent.objects.create(
+            webhook=webhook, event_id="whevt_new", processed_at=now()
+        )
+
+    with freeze_time("2024-12-10"):
+        call_command("prune_webhook_events")
+
+    assert set(WebhookEvent.objects.values_list("event_id", flat=True)) == {
+        "whevt_pending",
+        "whevt_new",
+    }
+
+
+def test_queued_events(api_client, settings):
+    settings.WEBHOOKS_EAGER = False
+    User.objects.create(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # deliveries are only queued
+    with CaptureQueriesContext(connection) as context:
+        response = _post_event(
+            api_client,
+            "/games/index/player-high-score",
+            "tests/webhooks/high-score.json",
+            webhook,
+        )
+    event = WebhookEvent.objects.get()
+    assert (
+        response.status_code == 200
+        and event.kind == "player-high-score"
+        and event.processed_at is None
+        and not PlayerHighScore.objects.exists()
+        and not [q for q in context.captured_queries if "playerhighscore" in q["sql"]]
+    )
+
+    # and processed by the worker
+    call_command("process_webhooks", "--once")
+    event.refresh_from_db()
+    assert (
+        event.processed_at is not None
+        and event.attempts == 1
+        and PlayerHighScore.objects.get().score == 3300
+    )
+
+
+def test_queued_events_reach_web_processes(api_client, settings, monkeypatch):
+    settings.WEBHOOKS_EAGER = False
+    settings.LEADERBOARD_SYNC_INTERVAL = timedelta(0)
+    settings.LEADERBOARD_EVENTS_KEEPALIVE = timedelta(milliseconds=10)
+    user = User.objects.create(eth_address="0xf4db918906946b53c8db2292239ac1c8b94145f6")
+    game = GameFactory(eth_address="0x6bd4a37fc5753425fa566103a51fd7355d940d48")
+    PlayerHighScoreFactory(user=user, game=game, score=0, token_id=1)
+    PlayerHighScoreFactory.create_batch(3, game=game, score=1000)
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # a web process serving the board and a live stream on it
+    response = api_client.get(f"/leaderboard/{game.id}")
+    etag = response["ETag"]
+    stream = api_client.get(f"/leaderboard/{game.id}/events")
+    lines = iter(stream.streaming_content)
+    assert next(lines) == b"retry: 3000\n\n"
+
+    _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/high-score.json",
+        webhook,
+    )
+
+    # the worker runs in its own process, without the web process's boards or streams
+    with monkeypatch.context() as worker:
+        worker.setattr("games.leaderboard._leaderboards", {})
+        worker.setattr("games.events._subscribers", {})
+        call_command("process_webhooks", "--once")
+
+    # the web process picks the change up for its stream and board
+    line = next(line for line in lines if line != b": keepalive\n\n")
+    event = json.loads(line.decode().split("data: ")[1])
+    assert (
+        event["user_id"] == user.id
+        and event["score"] == 3300
+        and event["rank"] == 1
+        and event["previous_rank"] == 4
+    )
+    stream.close()
+
+    response = api_client.get(f"/leaderboard/{game.id}", HTTP_IF_NONE_MATCH=etag)
+    assert (
+        response.status_code == 200
+        and response["ETag"] != etag
+        and response.json()["results"][0]["score"] == 3300
+    )
+
+    # changes are kept for a while for processes to sync
+    with freeze_time(now() + settings.LEADERBOARD_CHANGE_RETENTION):
+        call_command("prune_leaderboard_changes")
+    assert not LeaderboardChange.objects.exists()
+
+
+def test_queued_event_failure(api_client, settings):
+    settings.WEBHOOKS_EAGER = False
+    settings.WEBHOOK_MAX_ATTEMPTS = 3
+    settings.WEBHOOK_RETRY_BACKOFF = timedelta(seconds=30)
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+    failing = WebhookEvent.objects.create(
+        webhook=webhook,
+        event_id="whevt_bad",
+        kind="player-high-score",
+        payload=b"{}",
+    )
+    _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/register.json",
+        webhook,
+    )
+
+    # a failing event doesn't hold up the ones behind it, and backs off before a retry
+    with freeze_time(now()) as frozen:
+        assert process_pending() == 2 and process_pending() == 0
+        failing.refresh_from_db()
+        assert failing.attempts == 1 and failing.next_attempt_at == now() + timedelta(
+            seconds=30
+        )
+
+        # each retry waits twice as long as the last
+        frozen.tick(timedelta(seconds=30))
+        assert process_pending() == 1 and process_pending() == 0
+        failing.refresh_from_db()
+        assert failing.attempts == 2 and failing.next_attempt_at == now() + timedelta(
+            seconds=60
+        )
+
+        # until the attempts run out
+        frozen.tick(timedelta(seconds=60))
+        assert process_pending() == 1
+        frozen.tick(timedelta(hours=1))
+        assert process_pending() == 0
+
+    failing.refresh_from_db()
+    assert (
+        failing.processed_at is None
+        and failing.attempts == 3
+        and "KeyError" in failing.error
+        and WebhookEvent.objects.filter(processed_at__isnull=False).count() == 1
+    )
+
+
+def test_forged_event_is_not_parsed(api_client):
+    Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # a valid head on a body that isn't JSON, signed with the wrong key
+    body = b'{"webhookId":"wh_6l5v7cnr8qidv5fe","id":"whevt_forged",' + b"[" * 10_000
+    response = api_client.post(
+        "/games/index/player-high-score",
+        body,
+        content_type="application/json",
+        headers={"x-alchemy-signature": "00" * 32},
+    )
+    assert response.status_code == 400 and not WebhookEvent.objects.exists()
+
+    # signed bodies without an event id are turned away
+    body = b'{"webhookId":"wh_6l5v7cnr8qidv5fe","event":{}}'
+    response = api_client.post(
+        "/games/index/player-high-score",
+        body,
+        content_type="application/json",
+        headers={
+            "x-alchemy-signature": hmac.HMAC(
+                b"test-signing-key", body, "sha256"
+            ).hexdigest()
+        },
+    )
+    assert response.status_code == 400 and not WebhookEvent.objects.exists()
+
+    # unknown webhooks are turned away before the signature is even checked
+    response = api_client.post(
+        "/games/index/player-high-score",
+        b"not json",
+        content_type="application/json",
+        headers={"x-alchemy-signature": "00" * 32},
+    )
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize(
+    ["body", "expected"],
+    [
+        (b'{"webhookId":"wh_1","id":"whevt_1"}', "whevt_1"),
+        (b'{ "webhookId" : "wh_1", "id": "whevt_1" }', "whevt_1"),
+        (b'{"account":{"id":"acct_1"},"id":"whevt_1"}', "whevt_1"),
+        (b'{"note":"{\\"id\\":\\"x\\"","id":"whevt_1"}', "whevt_1"),
+        (b'{"event":{"id":"whevt_1"},"other":"x"}', None),
+        (b'[{"id":"whevt_1"}]', None),
+    ],
+)
+def test_scan_fields(body, expected):
+    assert scan_fields(body, "id").get("id") == expected
+
+
+def test_event_with_nested_ids(api_client):
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+
+    # nested ids ahead of the event's own id don't make distinct events duplicates
+    for event_id in ["whevt_first", "whevt_second"]:
+        body = json.dumps(
+            {
+                "webhookId": webhook.webhook_id,
+                "account": {"id": "acct_1"},
+                "id": event_id,
+                "event": {"data": {"block": {"logs": []}}},
+            }
+        ).encode()
+        signature = hmac.HMAC(b"test-signing-key", body, "sha256").hexdigest()
+        response = api_client.post(
+            "/games/index/player-high-score",
+            body,
+            content_type="application/json",
+            headers={"x-alchemy-signature": signature},
+        )
+        assert response.status_code == 200
+
+    # events without a sequence number are still queued
+    assert set(WebhookEvent.objects.values_list("event_id", "sequence_number")) == {
+        ("whevt_first", None),
+        ("whevt_second", None),
+    }
+
+
+def test_event_with_reordered_fields(api_client):
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+    body = json.dumps(
+        {
+            "webhookId": webhook.webhook_id,
+            "event": {"data": {"block": {"logs": []}}, "sequenceNumber": "7"},
+            "filler": "x" * 2000,
+            "id": "whevt_reordered",
+        }
+    ).encode()
+    signature = hmac.HMAC(b"test-signing-key", body, "sha256").hexdigest()
+
+    response = api_client.post(
+        "/games/index/player-high-score",
+        body,
+        content_type="application/json",
+        headers={"x-alchemy-signature": signature},
+    )
+
+    event = WebhookEvent.objects.get()
+    assert (
+        response.status_code == 200
+        and event.event_id == "whevt_reordered"
+        and event.sequence_number == 7
+        and event.processed_at is not None
+    )
+
+
+def test_webhook_registry(api_client, settings):
+    settings.WEBHOOKS_EAGER = False
+    webhook = Webhook.objects.create(
+        webhook_id="wh_6l5v7cnr8qidv5fe",
+        signing_key="test-signing-key",
+    )
+    assert get_webhook(webhook.webhook_id).id == webhook.id
+
+    # a warm registry verifies deliveries without reading webhooks, the request's
+    # first query after BEGIN looks up the event
+    with CaptureQueriesContext(connection) as context:
+        response = _post_event(
+            api_client,
+            "/games/index/player-high-score",
+            "tests/webhooks/register.json",
+            webhook,
+        )
+    assert (
+        response.status_code == 200
+        and "webhooks_webhookevent" in context.captured_queries[1]["sql"]
+        and not [
+            q
+            for q in context.captured_queries
+            if q["sql"].startswith("SELECT") and '"webhooks_webhook"' in q["sql"]
+        ]
+    )
+
+    # saving a webhook clears the registry, so the new key is used straight away
+    webhook.signing_key = "new-signing-key"
+    webhook.save()
+    response = _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/high-score.json",
+        Webhook(signing_key="test-signing-key"),
+    )
+    assert response.status_code == 400
+    response = _post_event(
+        api_client,
+        "/games/index/player-high-score",
+        "tests/webhooks/high-score.json",
+        webhook,
+    )
+    assert response.status_code == 200
+
+
+def test_webhook_registry_ttl(settings):
+    settings.WEBHOOK_REGISTRY_TTL = timedelta(minutes=1)
+    assert get_webhook("wh_new") is None
+
+    # writes that skip save() are picked up once the registry goes stale
+    Webhook.objects.bulk_create([Webhook(webhook_id="wh_new", signing_key="key")])
+    assert get_webhook("wh_new") is None
+    settings.WEBHOOK_REGISTRY_TTL = timedelta(0)
+    assert get_webhook("wh_new").verify(
+        b"{}", hmac.HMAC(b"key", b"{}", "sha256").hexdigest()
+    )
@@ -0,0 +1,28 @@
+"""Common view mixins for reuse across apps"""
+
+
+class CursorModeMixin:
+    """
+    Lets a list view opt into keyset pagination per request. Requests that send a
+    `cursor` query param (an empty value starts at the first page) are paginated
+    with `cursor_pagination_class`, everything else keeps `pagination_class`.
+    """
+
+    cursor_pagination_class = None
+
+    @property
+    def is_cursor_mode(self) -> bool:
+        return (
+            self.cursor_pagination_class is not None
+            and self.cursor_pagination_class.cursor_query_param
+            in self.request.query_params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.is_cursor_mode:
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = super().paginator
+        return self._paginator
@@ -0,0 +1,16 @@
+"""Common content negotiation for reuse across apps"""
+
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """
+    Skips negotiating on the `Accept` header, for views that stream their own content type.
+    Anything rendered by DRF, such as errors, uses the view's first renderer.
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0] if parsers else None
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return (renderers[0], renderers[0].media_type)
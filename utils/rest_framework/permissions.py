@@ -0,0 +1,19 @@
+"""Common permissions for reuse across apps"""
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+class IsGameServer(BasePermission):
+    """
+    Allows access to accounts in the `GAME_SERVER_GROUP` group. Game servers get their own
+    group instead of staff, so reporting scores doesn't come with a login to the admin.
+    """
+
+    def has_permission(self, request, view):
+        user = request.user
+        return bool(
+            user
+            and user.is_authenticated
+            and user.groups.filter(name=settings.GAME_SERVER_GROUP).exists()
+        )
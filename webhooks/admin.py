@@ -1,10 +1,18 @@
 from django.contrib import admin
 
-from .models import Webhook
+from .models import Webhook, WebhookEvent
 
 
 class WebhookAdmin(admin.ModelAdmin):
-    list_display = ("webhook_id",)
+    list_display = ("webhook_id", "last_sequence_number")
+    readonly_fields = ("last_sequence_number",)
 
 
-admin.site.register(Webhook)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ("event_id", "webhook", "sequence_number", "created_at")
+    list_filter = ("webhook",)
+    search_fields = ("event_id",)
+
+
+admin.site.register(Webhook, WebhookAdmin)
+admin.site.register(WebhookEvent, WebhookEventAdmin)
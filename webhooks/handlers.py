@@ -0,0 +1,193 @@
+"""
+Webhook event handlers. Each takes a delivery's parsed payload and is run by the
+webhook queue worker, see `webhooks.queue`.
+"""
+
+import structlog
+from django.contrib.auth import get_user_model
+from eth_abi import decode
+from hexbytes import HexBytes
+
+from api.constants import (
+    PLAYER_HIGH_SCORE_TOPIC_0,
+    PLAYER_REGISTERED_TOPIC_0,
+    SCORE_CONSUMED_TOPIC_0,
+)
+from games.leaderboard import record_high_scores
+from games.models import Game, PlayerHighScore
+from games.nonces import record_consumed_nonces
+
+logger = structlog.getLogger(__name__)
+
+User = get_user_model()
+
+
+def index_player_high_score(data: dict):
+    """Indexes data whenever a player submits a score onchain"""
+    """Example payload:
+
+    {
+        "webhookId": "wh_6l5v7cnr8qidv5fe",
+        "id": "whevt_wu0em1hlbdlnnheo",
+        "createdAt": "2024-12-16T19:41:47.211Z",
+        "type": "GRAPHQL",
+        "event": {
+            "data": {
+                "block": {
+                    "hash": "0xc726b598788c14820dc422a95cc328e7f56316f727e735b1bed7adcd29c9fe4b",
+                    "number": 7720973,
+                    "timestamp": 1734378106,
+                    "logs": [
+                        {
+                            "data": "0x",
+                            "topics": [
+                                "0x324cb0062138d65997c86cd3012489ceb351d602f2f55c7408306e8040c79f3f",
+                                "0x000000000000000000000000181f59eb6490c8bf73d291af0d5a56dc90d7cd8b",
+                                "0x0000000000000000000000000000000000000000000000000000000000000002"
+                            ],
+                            "index": 1,
+                            "account": {
+                                "address": "0x6bd4a37fc5753425fa566103a51fd7355d940d48"
+                            },
+                            "transaction": {
+                                "hash": "0x927bd72c94aafde7d51da1df4846758d13f016d396ae5ad23e13838ce309b8fc",
+                                "from": {
+                                    "address": "0x181f59eb6490c8bf73d291af0d5a56dc90d7cd8b"
+                                },
+                                "to": {
+                                    "address": "0xca11bde05977b3631167028862be2a173976ca11"
+                                },
+                                "value": "0x5af3107a4000",
+                                "status": 1
+                            }
+                        },
+                        {
+                            "data": "0x",
+                            "topics": [
+                                "0xec51f1f19b3cb8ab4176d8a463cb3b7a4bb866380c5ee1c51da9577ad94db00a",
+                                "0x000000000000000000000000181f59eb6490c8bf73d291af0d5a56dc90d7cd8b",
+                                "0x0000000000000000000000000000000000000000000000000000000000000002",
+                                "0x00000000000000000000000000000000000000000000000000000000000003e8"
+                            ],
+                            "index": 2,
+                            "account": {
+                                "address": "0x6bd4a37fc5753425fa566103a51fd7355d940d48"
+                            },
+                            "transaction": {
+                                "hash": "0x927bd72c94aafde7d51da1df4846758d13f016d396ae5ad23e13838ce309b8fc",
+                                "from": {
+                                    "address": "0x181f59eb6490c8bf73d291af0d5a56dc90d7cd8b"
+                                },
+                                "to": {
+                                    "address": "0xca11bde05977b3631167028862be2a173976ca11"
+                                },
+                                "value": "0x5af3107a4000",
+                                "status": 1
+                            }
+                        }
+                    ]
+                }
+            },
+            "sequenceNumber": "10000000006588185002",
+            "network": "SHAPE_SEPOLIA"
+        }
+    }
+    """
+    # parse the data from the webhook
+    logs = [
+        log
+        for log in data["event"]["data"]["block"]["logs"]
+        if log["topics"][0] in (PLAYER_REGISTERED_TOPIC_0, PLAYER_HIGH_SCORE_TOPIC_0)
+    ]
+
+    # resolve every game and player in the block at once
+    players = [
+        decode(["address"], HexBytes(log["topics"][1]))[0].lower() for log in logs
+    ]
+    game_ids = dict(
+        Game.objects.filter(
+            eth_address__in={log["account"]["address"].lower() for log in logs}
+        ).values_list("eth_address", "id")
+    )
+    user_ids = dict(
+        User.objects.filter(eth_address__in=set(players)).values_list(
+            "eth_address", "id"
+        )
+    )
+
+    # parse the logs
+    rows = []
+    for log, player_address in zip(logs, players):
+        # ensure it was sent from a registered game
+        game_id = game_ids.get(log["account"]["address"].lower())
+        if game_id is None:
+            continue
+
+        user_id = user_ids.get(player_address)
+        if user_id is None:
+            logger.warning("Unknown player in webhook log.", player=player_address)
+            continue
+
+        token_id = decode(["uint256"], HexBytes(log["topics"][2]))[0]
+        score = 0
+        if log["topics"][0] == PLAYER_HIGH_SCORE_TOPIC_0:
+            score = decode(["uint256"], HexBytes(log["topics"][3]))[0]
+        rows.append((user_id, game_id, token_id, score))
+
+    # create or raise the high scores in one statement
+    record_high_scores(PlayerHighScore.upsert_many(rows))
+
+
+def index_score_consumed(data: dict):
+    """Indexes score nonces whenever a player uses a signed score onchain"""
+    # parse the data from the webhook
+    logs = data["event"]["data"]["block"]["logs"]
+
+    # group the nonces by game
+    nonces_by_game: dict[int, list[str]] = {}
+    games = {}
+    for log in logs:
+        if log["topics"][0] != SCORE_CONSUMED_TOPIC_0:
+            continue
+
+        # ensure it was sent from a registered game
+        game_address = log["account"]["address"].lower()
+        if game_address not in games:
+            games[game_address] = (
+                Game.objects.filter(eth_address=game_address)
+                .values_list("id", flat=True)
+                .first()
+            )
+        if games[game_address] is None:
+            continue
+
+        # the nonce is a bytes32 topic, the same hex string scores store
+        nonce = log["topics"][3].lower()
+        nonces_by_game.setdefault(games[game_address], []).append(nonce)
+
+    # record the nonces and clear their scores
+    for game_id, nonces in nonces_by_game.items():
+        deleted = record_consumed_nonces(game_id, nonces)
+        logger.info(
+            "Indexed consumed scores.",
+            game_id=game_id,
+            nonces=len(nonces),
+            deleted=deleted,
+        )
+
+
+# TODO: Implement global ticket leaderboard later
+def index_tickets_dispensed(data: dict):
+    """Indexes tickets earned whenever a player submits a score onchain"""
+    # parse the data from the webhook
+
+    # get or create the player entry
+
+    # update model with total tickets earned
+
+
+HANDLERS = {
+    "player-high-score": index_player_high_score,
+    "score-consumed": index_score_consumed,
+    "tickets-dispensed": index_tickets_dispensed,
+}
@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from webhooks.queue import process_pending
+
+
+class Command(BaseCommand):
+    help = "Processes queued webhook events, runs until stopped unless --once is passed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue and exit"
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = settings.WEBHOOK_POLL_INTERVAL.total_seconds()
+        while True:
+            # the worker outlives its connections, drop broken or expired ones
+            close_old_connections()
+            processed = process_pending()
+            if processed:
+                self.stdout.write(f"Processed {processed} webhook events")
+            elif options["once"]:
+                return
+            else:
+                time.sleep(poll_interval)
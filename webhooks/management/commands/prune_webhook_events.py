@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils.timezone import now
+
+from webhooks.models import WebhookEvent
+
+
+class Command(BaseCommand):
+    help = "Deletes old processed webhook events, run on a schedule"
+
+    def handle(self, *args, **options):
+        cutoff = now() - settings.WEBHOOK_EVENT_RETENTION
+        # events still waiting to be retried are kept
+        events = WebhookEvent.objects.filter(created_at__lt=cutoff).filter(
+            Q(processed_at__isnull=False)
+            | Q(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS)
+        )
+
+        # delete in chunks to keep each statement short
+        total = 0
+        while ids := list(
+            events.values_list("id", flat=True)[
+                : settings.WEBHOOK_EVENT_PRUNE_CHUNK_SIZE
+            ]
+        ):
+            deleted, _ = WebhookEvent.objects.filter(id__in=ids).delete()
+            total += deleted
+
+        self.stdout.write(f"Pruned {total} webhook events")
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("webhooks", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhook",
+            name="last_sequence_number",
+            field=models.DecimalField(
+                blank=True, decimal_places=0, max_digits=30, null=True
+            ),
+        ),
+        migrations.CreateModel(
+            name="WebhookEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("event_id", models.CharField(max_length=100, unique=True)),
+                (
+                    "sequence_number",
+                    models.DecimalField(
+                        blank=True, decimal_places=0, max_digits=30, null=True
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "webhook",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="webhooks.webhook",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["created_at"], name="webhook_event_created_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("webhooks", "0002_webhookevent"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="webhookevent",
+            name="kind",
+            field=models.CharField(default="", max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="payload",
+            field=models.BinaryField(default=b""),
+            preserve_default=False,
+        ),
+        # events recorded before the queue were processed inline
+        migrations.AddField(
+            model_name="webhookevent",
+            name="processed_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            "UPDATE webhooks_webhookevent SET processed_at = created_at",
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="webhookevent",
+            name="error",
+            field=models.TextField(blank=True, default=""),
+        ),
+        migrations.AddIndex(
+            model_name="webhookevent",
+            index=models.Index(
+                condition=models.Q(("processed_at__isnull", True)),
+                fields=["id"],
+                name="webhook_event_pending_idx",
+            ),
+        ),
+    ]
@@ -1,9 +1,68 @@
-from django.db import models
+from django.db import models, transaction
 
 
 class Webhook(models.Model):
     webhook_id = models.CharField(max_length=100, unique=True)
     signing_key = models.CharField(max_length=100)
+    # highest `event.sequenceNumber` seen, deliveries below it arrived out of order
+    last_sequence_number = models.DecimalField(
+        max_digits=30, decimal_places=0, null=True, blank=True
+    )
 
     def __str__(self) -> str:
         return self.webhook_id
+
+    def save(self, *args, **kwargs):
+        from webhooks.registry import clear_webhook_registry
+
+        super().save(*args, **kwargs)
+        transaction.on_commit(clear_webhook_registry)
+
+    def delete(self, *args, **kwargs):
+        from webhooks.registry import clear_webhook_registry
+
+        deleted = super().delete(*args, **kwargs)
+        transaction.on_commit(clear_webhook_registry)
+        return deleted
+
+
+class WebhookEvent(models.Model):
+    """
+    Model to capture webhook deliveries. Verified deliveries are queued here with their raw
+    body and processed by the webhook worker, see `webhooks.queue`. The unique event id
+    also lets retried deliveries be acknowledged without being queued again. Processed
+    events are pruned on a schedule.
+    """
+
+    class Meta:
+        indexes = [
+            # pruning
+            models.Index(fields=["created_at"], name="webhook_event_created_idx"),
+            # the worker's queue
+            models.Index(
+                fields=["id"],
+                name="webhook_event_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
+    webhook = models.ForeignKey(Webhook, on_delete=models.CASCADE)
+    event_id = models.CharField(max_length=100, unique=True)
+    # `event.sequenceNumber`, read when the event is first processed
+    sequence_number = models.DecimalField(
+        max_digits=30, decimal_places=0, null=True, blank=True
+    )
+
+    # handler to run, see `webhooks.handlers`
+    kind = models.CharField(max_length=50)
+    payload = models.BinaryField()
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    # failed events wait until then before they are retried
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return self.event_id
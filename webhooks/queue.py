@@ -0,0 +1,128 @@
+"""
+Webhook work queue. Deliveries are verified and stored as `WebhookEvent` rows by the
+webhook views, which answer straight away, and are processed here in batches by the
+`process_webhooks` worker. Each event is locked with `SKIP LOCKED` and committed on its
+own, so several workers can drain the queue at once and a handler's leaderboard locks are
+only held for one event. Events that fail are retried up to `WEBHOOK_MAX_ATTEMPTS` times,
+backing off exponentially from `WEBHOOK_RETRY_BACKOFF`.
+"""
+
+import json
+from decimal import Decimal
+
+import structlog
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils.timezone import now
+
+from webhooks.handlers import HANDLERS
+from webhooks.models import Webhook, WebhookEvent
+
+logger = structlog.getLogger(__name__)
+
+
+def pending_events():
+    return (
+        WebhookEvent.objects.filter(
+            processed_at__isnull=True, attempts__lt=settings.WEBHOOK_MAX_ATTEMPTS
+        )
+        .filter(Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now()))
+        .order_by("id")
+    )
+
+
+def track_sequence_number(event: WebhookEvent, data: dict):
+    """
+    Records an event's sequence number on its first attempt and moves the webhook's
+    high-water mark, anything below it arrived out of order
+    """
+    sequence_number = data.get("event", {}).get("sequenceNumber")
+    if event.sequence_number is not None or sequence_number is None:
+        return
+    event.sequence_number = Decimal(sequence_number)
+
+    raised = (
+        Webhook.objects.filter(id=event.webhook_id)
+        .filter(
+            Q(last_sequence_number__isnull=True)
+            | Q(last_sequence_number__lt=event.sequence_number)
+        )
+        .update(last_sequence_number=event.sequence_number)
+    )
+    if not raised:
+        logger.warning(
+            "Out of order webhook event.",
+            event_id=event.event_id,
+            sequence_number=event.sequence_number,
+        )
+
+
+def process_event(event: WebhookEvent):
+    """
+    Parses an event's payload and runs its handler, failures are recorded on the event
+    instead of raised
+    """
+    try:
+        data = json.loads(bytes(event.payload))
+        track_sequence_number(event, data)
+        with transaction.atomic():
+            HANDLERS[event.kind](data)
+    except Exception as exc:
+        logger.exception("Failed to process webhook event.", event_id=event.event_id)
+        event.error = repr(exc)
+        event.next_attempt_at = now() + settings.WEBHOOK_RETRY_BACKOFF * (
+            2**event.attempts
+        )
+    else:
+        event.processed_at = now()
+        event.error = ""
+        event.next_attempt_at = None
+    event.attempts += 1
+    event.save(
+        update_fields=[
+            "sequence_number",
+            "processed_at",
+            "attempts",
+            "error",
+            "next_attempt_at",
+        ]
+    )
+
+
+def process_events(event_ids: list[int]) -> int:
+    """
+    Processes queued events in a transaction each, skipping any that another worker holds
+    or already finished, returns how many were processed
+    """
+    processed = 0
+    for event_id in event_ids:
+        with transaction.atomic():
+            event = (
+                pending_events()
+                .select_for_update(skip_locked=True)
+                .filter(id=event_id)
+                .first()
+            )
+            if event is not None:
+                process_event(event)
+                processed += 1
+    return processed
+
+
+def process_pending(batch_size: int | None = None) -> int:
+    """Processes a batch of queued events in arrival order, returns how many were processed"""
+    batch_size = batch_size or settings.WEBHOOK_PROCESS_BATCH_SIZE
+    event_ids = list(pending_events().values_list("id", flat=True)[:batch_size])
+    return process_events(event_ids)
+
+
+def process_events_on_commit(event_ids: list[int]):
+    """
+    Processes queued events once committed when `WEBHOOKS_EAGER` is set, otherwise they
+    are left for the worker
+    """
+    if not settings.WEBHOOKS_EAGER:
+        return
+
+    transaction.on_commit(lambda: process_events(event_ids))
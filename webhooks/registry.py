@@ -0,0 +1,67 @@
+"""
+In-process registry of webhook signing keys. Every webhook is loaded at once and kept
+for `WEBHOOK_REGISTRY_TTL`, with its HMAC already keyed, so verifying a delivery costs
+no queries and only a copy of the keyed state. Saving a webhook clears the registry of
+the process it was saved in, other processes pick the change up within the TTL.
+"""
+
+import hmac
+import threading
+from dataclasses import dataclass
+from time import monotonic
+
+from django.conf import settings
+
+from webhooks.models import Webhook
+
+_lock = threading.Lock()
+_webhooks: dict[str, "RegisteredWebhook"] = {}
+_loaded_at: float | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class RegisteredWebhook:
+    id: int
+    webhook_id: str
+    # keyed with the signing key, copy it before use
+    hmac: hmac.HMAC
+
+    def verify(self, body: bytes, signature: str) -> bool:
+        hmacc = self.hmac.copy()
+        hmacc.update(body)
+        # headers arrive latin-1 decoded, compare bytes so non-ASCII ones just don't match
+        return hmac.compare_digest(
+            hmacc.hexdigest().encode(), signature.encode("latin-1", "replace")
+        )
+
+
+def get_webhook(webhook_id: str) -> RegisteredWebhook | None:
+    """Gets a registered webhook, loading the registry if it is empty or stale"""
+    ttl = settings.WEBHOOK_REGISTRY_TTL.total_seconds()
+    if _loaded_at is None or monotonic() - _loaded_at > ttl:
+        load_webhooks()
+    return _webhooks.get(webhook_id)
+
+
+def load_webhooks():
+    global _webhooks, _loaded_at
+
+    webhooks = {
+        webhook_id: RegisteredWebhook(
+            id=id,
+            webhook_id=webhook_id,
+            hmac=hmac.new(bytes(signing_key, "utf-8"), digestmod="sha256"),
+        )
+        for id, webhook_id, signing_key in Webhook.objects.values_list(
+            "id", "webhook_id", "signing_key"
+        )
+    }
+    with _lock:
+        _webhooks, _loaded_at = webhooks, monotonic()
+
+
+def clear_webhook_registry():
+    global _webhooks, _loaded_at
+
+    with _lock:
+        _webhooks, _loaded_at = {}, None
@@ -1,170 +1,140 @@
-import hmac
+import re
 
 import structlog
-from django.contrib.auth import get_user_model
 from django.http import Http404
-from eth_abi import decode
-from hexbytes import HexBytes
 from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from api.constants import PLAYER_HIGH_SCORE_TOPIC_0
-from games.models import Game, PlayerHighScore
-from webhooks.models import Webhook
+from webhooks.models import WebhookEvent
+from webhooks.queue import process_events_on_commit
+from webhooks.registry import RegisteredWebhook, get_webhook
 
 logger = structlog.getLogger(__name__)
 
-User = get_user_model()
+# how far into a body fields are scanned for before falling back to the whole body
+WEBHOOK_SCAN_BYTES = 1024
+# JSON strings, with a trailing colon when they're keys, and brackets
+JSON_TOKEN_PATTERN = re.compile(rb'"((?:[^"\\]|\\.)*)"(\s*:)?|[{}\[\]]')
+
+
+def scan_fields(data: bytes, *keys: str) -> dict[str, str]:
+    """
+    Finds top level string fields in raw JSON bytes without parsing them, fields of nested
+    objects are skipped by tracking the bracket depth
+    """
+    wanted = {key.encode() for key in keys}
+    found = {}
+    depth = 0
+    key = None
+    for match in JSON_TOKEN_PATTERN.finditer(data):
+        token = match.group()
+        if token in (b"{", b"["):
+            depth += 1
+            key = None
+        elif token in (b"}", b"]"):
+            depth -= 1
+        elif match.group(2):
+            key = match.group(1) if depth == 1 else None
+        else:
+            value = match.group(1)
+            if key in wanted and 0 < len(value) <= 100 and b"\\" not in value:
+                found[key.decode()] = value.decode()
+                if len(found) == len(wanted):
+                    break
+            key = None
+    return found
 
 
 class WebhookApiView(APIView):
+    """
+    Base view for Alchemy webhooks. Deliveries are verified against the webhook's signing
+    key and queued by event id for the `kind` handler, then acknowledged straight away.
+    Retries of an event that was already queued are acknowledged without queueing it again.
+
+    Only the webhook id is scanned for before the body is checked against the signature,
+    and only the event id after, so bodies are never parsed at intake.
+    """
+
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    # handler for the deliveries, see `webhooks.handlers`
+    kind: str
+
     def initial(self, request, *args, **kwargs):
-        # get raw body in bytes
+        # get raw body in bytes, it isn't parsed until it's verified
         body = request.body
 
-        # get the webhook by id
-        try:
-            webhook = Webhook.objects.get(webhook_id=request.data["webhookId"])
-        except Webhook.DoesNotExist:
+        # get the webhook by id, scanned from the head of the body
+        webhook_id = scan_fields(body[:WEBHOOK_SCAN_BYTES], "webhookId").get(
+            "webhookId"
+        )
+        webhook = get_webhook(webhook_id) if webhook_id else None
+        if webhook is None:
             raise Http404()
 
         # verify webhook signature
-        self.verify_signature(body, webhook.signing_key)
+        self.verify_signature(body, webhook)
 
-    def verify_signature(self, body: bytes, signing_key: str) -> bool:
-        signature = self.request.headers.get("x-alchemy-signature")
-        hmacc = hmac.HMAC(bytes(signing_key, "utf-8"), body, "sha256")
+        # queue the event, retries of queued events are skipped
+        self.event = self.claim_event(webhook, body)
+
+    def post(self, request):
+        # processing happens off the request, see `webhooks.queue`
+        if self.event is not None:
+            process_events_on_commit([self.event.id])
 
-        if hmacc.digest().hex() != signature:
+        # return 200
+        return Response()
+
+    def verify_signature(self, body: bytes, webhook: RegisteredWebhook):
+        signature = self.request.headers.get("x-alchemy-signature", "")
+
+        if not webhook.verify(body, signature):
             logger.error("Invalid signature for webhook request.")
 
             raise ValidationError("Invalid signature.")
 
+    def claim_event(
+        self, webhook: RegisteredWebhook, body: bytes
+    ) -> WebhookEvent | None:
+        """
+        Queues a delivery's event, returns None if it was already queued. Only the event id
+        is scanned for, so retries are acknowledged without decoding the body, which is
+        parsed once when the event is processed.
+        """
+        event_id = scan_fields(body[:WEBHOOK_SCAN_BYTES], "id").get("id")
+        if event_id is None:
+            event_id = scan_fields(body, "id").get("id")
+        if event_id is None:
+            raise ValidationError("Invalid webhook event.")
 
-class IndexPlayerHighScoreView(WebhookApiView):
-    authentication_classes = []
-    permission_classes = [AllowAny]
+        event, created = WebhookEvent.objects.get_or_create(
+            event_id=event_id,
+            defaults={"webhook_id": webhook.id, "kind": self.kind, "payload": body},
+        )
+        if not created:
+            logger.info("Skipping duplicate webhook event.", event_id=event.event_id)
+            return None
 
-    def post(self, request):
-        """Endpoint to index data whenever a player submits a score onchain"""
-        """Example payload:
-    
-        {
-            "webhookId": "wh_6l5v7cnr8qidv5fe",
-            "id": "whevt_wu0em1hlbdlnnheo",
-            "createdAt": "2024-12-16T19:41:47.211Z",
-            "type": "GRAPHQL",
-            "event": {
-                "data": {
-                    "block": {
-                        "hash": "0xc726b598788c14820dc422a95cc328e7f56316f727e735b1bed7adcd29c9fe4b",
-                        "number": 7720973,
-                        "timestamp": 1734378106,
-                        "logs": [
-                            {
-                                "data": "0x",
-                                "topics": [
-                                    "0x324cb0062138d65997c86cd3012489ceb351d602f2f55c7408306e8040c79f3f",
-                                    "0x000000000000000000000000181f59eb6490c8bf73d291af0d5a56dc90d7cd8b",
-                                    "0x0000000000000000000000000000000000000000000000000000000000000002"
-                                ],
-                                "index": 1,
-                                "account": {
-                                    "address": "0x6bd4a37fc5753425fa566103a51fd7355d940d48"
-                                },
-                                "transaction": {
-                                    "hash": "0x927bd72c94aafde7d51da1df4846758d13f016d396ae5ad23e13838ce309b8fc",
-                                    "from": {
-                                        "address": "0x181f59eb6490c8bf73d291af0d5a56dc90d7cd8b"
-                                    },
-                                    "to": {
-                                        "address": "0xca11bde05977b3631167028862be2a173976ca11"
-                                    },
-                                    "value": "0x5af3107a4000",
-                                    "status": 1
-                                }
-                            },
-                            {
-                                "data": "0x",
-                                "topics": [
-                                    "0xec51f1f19b3cb8ab4176d8a463cb3b7a4bb866380c5ee1c51da9577ad94db00a",
-                                    "0x000000000000000000000000181f59eb6490c8bf73d291af0d5a56dc90d7cd8b",
-                                    "0x0000000000000000000000000000000000000000000000000000000000000002",
-                                    "0x00000000000000000000000000000000000000000000000000000000000003e8"
-                                ],
-                                "index": 2,
-                                "account": {
-                                    "address": "0x6bd4a37fc5753425fa566103a51fd7355d940d48"
-                                },
-                                "transaction": {
-                                    "hash": "0x927bd72c94aafde7d51da1df4846758d13f016d396ae5ad23e13838ce309b8fc",
-                                    "from": {
-                                        "address": "0x181f59eb6490c8bf73d291af0d5a56dc90d7cd8b"
-                                    },
-                                    "to": {
-                                        "address": "0xca11bde05977b3631167028862be2a173976ca11"
-                                    },
-                                    "value": "0x5af3107a4000",
-                                    "status": 1
-                                }
-                            }
-                        ]
-                    }
-                },
-                "sequenceNumber": "10000000006588185002",
-                "network": "SHAPE_SEPOLIA"
-            }
-        }
-        """
-        # parse the data from the webhook
-        logs = request.data["event"]["data"]["block"]["logs"]
-
-        # parse the logs
-        for log in logs:
-            # ensure it was sent from a registered game
-            game_address = log["account"]["address"]
-            try:
-                game = Game.objects.get(eth_address__iexact=game_address)
-            except Game.DoesNotExist:
-                continue
-
-            # get or create the player entry
-            player_address = decode(["address"], HexBytes(log["topics"][1]))[0]
-            token_id = decode(["uint256"], HexBytes(log["topics"][2]))[0]
-            user = User.objects.get(eth_address__iexact=player_address)
-            phs, _ = PlayerHighScore.objects.get_or_create(
-                user=user, game=game, token_id=token_id
-            )
-
-            # update with the new high score
-            if log["topics"][0] == PLAYER_HIGH_SCORE_TOPIC_0:
-                score = decode(["uint256"], HexBytes(log["topics"][3]))[0]
-                if score > phs.score:
-                    phs.score = score
-                    phs.save()
+        return event
 
-        # return 200
-        return Response()
 
+class IndexPlayerHighScoreView(WebhookApiView):
+    """Endpoint to index data whenever a player submits a score onchain"""
 
-# TODO: Implement global ticket leaderboard later
-class IndexTicketsDispensedView(WebhookApiView):
-    authentication_classes = []
-    permission_classes = [AllowAny]
+    kind = "player-high-score"
 
-    def post(self, request):
-        """Endpoint to index tickets earned whenever a player submits a score onchain"""
-        # get the webhook by id
 
-        # verify webhook signature
+class IndexScoreConsumedView(WebhookApiView):
+    """Endpoint to index score nonces whenever a player uses a signed score onchain"""
 
-        # parse the data from the webhook
+    kind = "score-consumed"
 
-        # get or create the player entry
 
-        # update model with total tickets earned
+class IndexTicketsDispensedView(WebhookApiView):
+    """Endpoint to index tickets earned whenever a player submits a score onchain"""
 
-        # return 200
-        return Response()
+    kind = "tickets-dispensed"